@@ -0,0 +1,133 @@
+"""
+真！こうかとん無双のバッチシミュレーション
+シードを変えた多数のゲームを自動操作（BotInput）で画面なしに実行し，プロセスプールで
+CPUコアに振り分ける．1ゲームごとの結果を順に書き出し，スコア・生存時間・クリア率を集計する
+（ボスの体力や敵の出現などのバランス調整は --level のステージファイルで変える）
+
+実行例：
+    python batch.py --games 2000 --out results.jsonl --report report.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame as pg
+
+import musou_kokaton as mk
+
+
+def init_worker():
+    """
+    ワーカープロセスの初期化（スコア表示にフォントを使うのでフォントだけ初期化する）
+    pg.init()はSDLがSIGTERMを横取りし，プールの終了時にワーカーが終わらなくなるので使わない
+    """
+    pg.font.init()
+
+
+def play(job: tuple) -> dict:
+    """
+    1ゲームを最後まで（または最大フレーム数まで）自動操作で実行する
+    引数 job：（シード，最大フレーム数，人数，配列版の弾処理，精密な当たり判定，ステージファイル）
+    戻り値：シード，フレーム数，生存秒数，スコア，進行状態の辞書
+    """
+    seed, frames, players, vector, precise, level = job
+    result = mk.run_headless(frames, seed, vector, level=level, players=players, bots=True, precise=precise)
+    return {
+        "seed": seed,
+        "frames": result["frames"],
+        "seconds": result["frames"]/mk.FPS,
+        "score": result["score"],
+        "state": result["state"],
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    並べ替え済みのリストのq分位点を返す
+    引数1 values：昇順に並べた値のリスト
+    引数2 q：0～1の割合
+    """
+    return values[min(len(values)-1, int(len(values)*q))]
+
+
+def summarize(results: list[dict]) -> dict:
+    """
+    ゲームごとの結果を集計する
+    引数 results：play()の戻り値のリスト
+    戻り値：ゲーム数，結果ごとの割合，スコアと生存秒数の統計の辞書
+    """
+    n = len(results)
+    states = {state: sum(r["state"] == state for r in results)/n for state in ("clear", "over", "playing")}
+    report = {"games": n, "clear_rate": states["clear"], "over_rate": states["over"], "timeout_rate": states["playing"]}
+    for key in ("score", "seconds"):
+        values = sorted(r[key] for r in results)
+        report[key] = {
+            "mean": statistics.fmean(values),
+            "min": values[0],
+            "p10": percentile(values, 0.1),
+            "median": statistics.median(values),
+            "p90": percentile(values, 0.9),
+            "max": values[-1],
+        }
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="真！こうかとん無双のバッチシミュレーション")
+    parser.add_argument("--games", type=int, default=200, help="実行するゲーム数")
+    parser.add_argument("--seed", type=int, default=0, help="最初のゲームのシード（1ゲームごとに1ずつ増やす）")
+    parser.add_argument("--frames", type=int, default=10000, help="1ゲームの最大フレーム数")
+    parser.add_argument("--players", type=int, default=2, choices=range(1, mk.MAX_PLAYERS+1), help="こうかとんの数")
+    parser.add_argument("--vector", action="store_true", help="弾をNumPy配列でまとめて処理する")
+    parser.add_argument("--precise", action="store_true", help="画像の不透明部分で当たり判定する")
+    parser.add_argument("--level", default=mk.LEVEL, help="敵の出現スケジュールを書いたステージファイルのパス")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="プロセス数（初期値はCPUコア数）")
+    parser.add_argument("--chunksize", type=int, default=4, help="1回にまとめてワーカーに渡すゲーム数")
+    parser.add_argument("--out", default=None, help="1ゲームごとの結果を書き出すJSON Linesのパス")
+    parser.add_argument("--report", default=None, help="集計結果を保存するJSONのパス")
+    args = parser.parse_args()
+    if args.vector and mk.load_numpy() is None:
+        parser.error("--vectorにはNumPyが必要です")
+
+    level = os.path.abspath(args.level)  # ワーカーの作業ディレクトリによらず読めるように
+    jobs = [(args.seed+i, args.frames, args.players, args.vector, args.precise, level) for i in range(args.games)]
+    results = []
+    out = open(args.out, "w") if args.out is not None else None
+    start = time.perf_counter()
+    try:
+        with multiprocessing.Pool(args.workers, initializer=init_worker) as pool:
+            for result in pool.imap_unordered(play, jobs, args.chunksize):  # 終わったゲームから順に受け取る
+                results.append(result)
+                if out is not None:
+                    out.write(json.dumps(result)+"\n")
+                if len(results) % max(1, args.games//10) == 0:
+                    print(f"{len(results)}/{args.games} games", file=sys.stderr)
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = time.perf_counter()-start
+
+    report = summarize(results) | {
+        "workers": args.workers,
+        "wall_seconds": elapsed,
+        "games_per_second": len(results)/elapsed if elapsed > 0 else 0.0,
+        "config": {"seed": args.seed, "frames": args.frames, "players": args.players,
+                   "vector": args.vector, "precise": args.precise, "level": args.level},
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
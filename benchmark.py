@@ -0,0 +1,350 @@
+"""
+真！こうかとん無双のベンチマーク
+固定シードの負荷シナリオを画面なしで実行し，フレーム毎秒，1フレームの平均・p99時間，
+ピークメモリをJSONに保存する．基準値（--baseline）より遅い・重いシナリオがあれば失敗する
+
+実行例：
+    python benchmark.py --out bench.json --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame as pg
+
+import musou_kokaton as mk
+
+
+SEED = 1  # 全シナリオ共通のシード
+NO_INPUT = (0, 0)  # こうかとんは動かさない（ビームは自動発射される）
+
+
+def setup_waves(game: mk.Game):
+    """
+    通常の出現スケジュール：こうかとんを無敵にしてそのまま進める
+    """
+    game.invincible = True
+
+
+def setup_bombs(game: mk.Game):
+    """
+    爆弾500個：画面右側の10か所から爆弾を補充し続ける
+    """
+    game.invincible = True
+    game.bomb_emitters = []
+    for i in range(10):
+        emitter = mk.Bomb_Enemy(game.rng)
+        emitter.rect.center = mk.WIDTH-200, 100+i*45
+        game.bomb_emitters.append(emitter)
+
+
+def tick_bombs(game: mk.Game):
+    """
+    生存中の爆弾が500個になるまで補充する
+    """
+    targets = game.birds
+    i = 0
+    while len(game.bombs) < 500:
+        emitter = game.bomb_emitters[i % len(game.bomb_emitters)]
+        game.bombs.add(mk.Bomb.spawn(game.pools, emitter, targets[i % len(targets)], game.rng))
+        i += 1
+
+
+def setup_boss(game: mk.Game):
+    """
+    ボス戦：停止位置のボスが毎フレームBossBeamを撃ち続ける
+    """
+    game.invincible = True
+    boss = mk.Boss(game.boss_beams, game.pools)
+    boss.rect.centerx = boss.bound
+    boss.vx = 0
+    boss.state = "stopped"
+    boss.beam_interval = 1
+    game.boss.add(boss)
+
+
+def tick_keep_boss(game: mk.Game):
+    """
+    ボスを倒させない（ゲームクリアで終わらないようにする）
+    """
+    for boss in game.boss:
+        boss.health = 10**9
+
+
+def entity_memory(count: int = 10000) -> dict[str, float]:
+    """
+    種類ごとにcount個のスプライトを生成してグループに入れ，増えたメモリを測る
+    引数 count：種類ごとに生成する数
+    戻り値：種類名 → 増えたメモリ（KiB）の辞書
+    """
+    rng = random.Random(SEED)
+    game = mk.Game(seed=SEED)
+    emy = mk.Enemy(rng)
+    makers = {  # プールを通さずに毎回新しく生成する
+        "Beam": lambda: mk.Beam(game.birds[0]),
+        "Bomb": lambda: mk.Bomb(emy, game.birds[0], rng),
+        "BossBeam": lambda: mk.BossBeam(emy),
+        "Enemy": lambda: mk.Enemy(rng),
+        "Item": lambda: mk.Item(emy.rect.center),
+    }
+    result = {}
+    for name, make in makers.items():
+        make()  # 画像の読み込みを計測に含めない
+        group = pg.sprite.Group()
+        tracemalloc.start()
+        for _ in range(count):
+            sprite = make()
+            sprite.prev_topleft = sprite.rect.topleft  # 補間描画のときと同じ属性を持たせる
+            group.add(sprite)
+        result[name] = tracemalloc.get_traced_memory()[0]/1024
+        tracemalloc.stop()
+        group.empty()
+    game.close()
+    return result
+
+
+def snapshot_cost(vector: bool, precise: bool = False, counts: tuple[int, ...] = (0, 100, 1000, 5000),
+                  repeat: int = 20000) -> dict[str, dict[str, float]]:
+    """
+    生存中の爆弾の数を変えて，Game.snapshot()とGame.restore()の1回あたりの時間とGameStateの大きさを測る
+    引数1 vector：弾を配列版で処理するかどうか
+    引数2 precise：画像の不透明部分で当たり判定するかどうか
+    引数3 counts：測る爆弾の数
+    引数4 repeat：爆弾の数×繰り返し回数の目安（少ないときほど多く繰り返す）
+    戻り値：爆弾の数 → 取り出し・戻しの時間（マイクロ秒），大きさ（KiB）の辞書
+    """
+    result = {}
+    for count in counts:
+        game = mk.Game(vector, seed=SEED, precise=precise)
+        setup_bombs(game)
+        game.step(NO_INPUT)
+        i = 0
+        while len(game.bombs) < count:
+            game.bombs.add(mk.Bomb.spawn(game.pools, game.bomb_emitters[i % 10], game.birds[0], game.rng))
+            i += 1
+        reps = max(20, repeat//max(1, count))
+        start = time.perf_counter()
+        for _ in range(reps):
+            state = game.snapshot()
+        taken = time.perf_counter()-start
+        start = time.perf_counter()
+        for _ in range(reps):
+            game.restore(state)
+        restored = time.perf_counter()-start
+        del state
+        tracemalloc.start()  # 解放済みのタプルの再利用で小さく見えないよう，10個保持した平均を取る
+        states = [game.snapshot() for _ in range(10)]
+        size = tracemalloc.get_traced_memory()[0]/len(states)
+        tracemalloc.stop()
+        del states
+        result[str(count)] = {
+            "snapshot_us": taken/reps*1e6,
+            "restore_us": restored/reps*1e6,
+            "kib": size/1024,
+        }
+        game.close()
+    return result
+
+
+def tick_explosions(game: mk.Game):
+    """
+    連鎖撃破：毎フレーム画面内のランダムな位置に爆発を10個出す
+    """
+    for _ in range(10):
+        game.exps.spawn((game.rng.randrange(mk.WIDTH), game.rng.randrange(mk.HEIGHT)), 100)
+
+
+SCENARIOS = {  # シナリオ名 → （フレーム数，初期化関数，毎フレーム前に呼ぶ関数）
+    "waves": (1900, setup_waves, None),
+    "bombs500": (1000, setup_bombs, tick_bombs),
+    "boss": (1500, setup_boss, tick_keep_boss),
+    "explosions": (1000, setup_waves, tick_explosions),
+    "long_session": (20000, setup_waves, tick_keep_boss),
+}
+
+
+def run_scenario(name: str, vector: bool, screen: pg.Surface | None, bg: mk.Background | None,
+                 ticks_scale: float = 1.0, precise: bool = False) -> list[float]:
+    """
+    シナリオを1回実行し，フレームごとの処理時間を返す
+    引数1 name：シナリオ名
+    引数2 vector：弾を配列版で処理するかどうか
+    引数3 screen：描画先（Noneなら描画しない）
+    引数4 bg：背景（screenを指定するときに使う）
+    引数5 ticks_scale：フレーム数に掛ける倍率
+    引数6 precise：画像の不透明部分で当たり判定するかどうか
+    戻り値：フレームごとの処理時間（秒）のリスト
+    """
+    ticks, setup, tick = SCENARIOS[name]
+    game = mk.Game(vector, seed=SEED, precise=precise)
+    setup(game)
+    times = []
+    for _ in range(max(1, int(ticks*ticks_scale))):
+        start = time.perf_counter()
+        if tick is not None:
+            tick(game)
+        state = game.step(NO_INPUT)
+        if screen is not None:
+            bg.draw(screen, 4*game.tmr)
+            game.draw(screen)
+        times.append(time.perf_counter()-start)
+        if state != "playing":
+            break
+    return times
+
+
+def measure(name: str, vector: bool, screen: pg.Surface | None, bg: mk.Background | None,
+            ticks_scale: float = 1.0, precise: bool = False) -> dict:
+    """
+    シナリオの処理時間とピークメモリを計測する
+    （tracemallocは処理を遅くするので，時間とメモリは別々に実行して測る）
+    引数：run_scenario()と同じ
+    戻り値：フレーム数，フレーム毎秒，平均・p99時間（ミリ秒），ピークメモリ（KiB）の辞書
+    """
+    times = run_scenario(name, vector, screen, bg, ticks_scale, precise)
+    tracemalloc.start()
+    run_scenario(name, vector, screen, bg, ticks_scale, precise)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    ordered = sorted(times)
+    total = sum(times)
+    return {
+        "ticks": len(times),
+        "fps": len(times)/total if total > 0 else 0.0,
+        "mean_ms": total/len(times)*1000,
+        "p99_ms": ordered[min(len(ordered)-1, int(len(ordered)*0.99))]*1000,
+        "peak_kib": peak/1024,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    基準値と比べ，許容範囲を超えて悪くなった項目を返す
+    引数1 results：今回の結果
+    引数2 baseline：基準値の結果
+    引数3 tolerance：許容する悪化の割合（0.3なら30%）
+    戻り値：悪化した項目の説明のリスト
+    """
+    failures = []
+    for name, result in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for key in ("mean_ms", "p99_ms", "peak_kib"):
+            if result[key] > base[key]*(1+tolerance):
+                failures.append(f"{name}.{key}: {base[key]:.3f} -> {result[key]:.3f} "
+                                f"(+{(result[key]/base[key]-1)*100:.0f}%)")
+    for count, result in results.get("snapshots", {}).items():
+        base = baseline.get("snapshots", {}).get(count)
+        if base is None:
+            continue
+        for key in ("snapshot_us", "restore_us", "kib"):
+            if result[key] > base[key]*(1+tolerance):
+                failures.append(f"snapshots.{count}.{key}: {base[key]:.1f} -> {result[key]:.1f} "
+                                f"(+{(result[key]/base[key]-1)*100:.0f}%)")
+    for name, kib in results.get("entities", {}).items():
+        base = baseline.get("entities", {}).get(name)
+        if base is not None and kib > base*(1+tolerance):
+            failures.append(f"entities.{name}: {base:.1f} -> {kib:.1f} KiB (+{(kib/base-1)*100:.0f}%)")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="真！こうかとん無双のベンチマーク")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="実行するシナリオ（複数指定可，省略時は全部）")
+    parser.add_argument("--vector", action="store_true", help="弾をNumPy配列でまとめて処理する")
+    parser.add_argument("--precise", action="store_true", help="画像の不透明部分で当たり判定する")
+    parser.add_argument("--render", action="store_true", help="画面外のSurfaceへの描画も含めて測る")
+    parser.add_argument("--ticks-scale", type=float, default=1.0, help="各シナリオのフレーム数に掛ける倍率")
+    parser.add_argument("--out", default=None, help="結果を保存するJSONのパス")
+    parser.add_argument("--baseline", default=None, help="比較する基準値のJSONのパス")
+    parser.add_argument("--save-baseline", default=None, help="今回の結果を基準値として保存するパス")
+    parser.add_argument("--entities", action="store_true", help="種類ごとに1万個のスプライトのメモリも測る")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="爆弾の数を変えてGame.snapshot()とrestore()の時間と大きさも測る")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="基準値に対して許容する悪化の割合")
+    args = parser.parse_args()
+
+    pg.init()
+    try:
+        return run(args)
+    finally:
+        pg.quit()  # 基準値より悪化して失敗したときも後始末する
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    指定されたシナリオを測り，結果を表示・保存して基準値と比べる
+    引数 args：コマンドライン引数
+    戻り値：終了コード（基準値より悪化していれば1）
+    """
+    screen = bg = None
+    if args.render:
+        screen = pg.display.set_mode((mk.WIDTH, mk.HEIGHT))
+        mk.ASSETS.convert_all()
+        bg = mk.Background([("fig/pg_bg.jpg", 1.0)])
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pg.version.ver,
+            "machine": platform.machine(),
+            "vector": args.vector,
+            "render": args.render,
+            "precise": args.precise,
+            "seed": SEED,
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        result = measure(name, args.vector, screen, bg, args.ticks_scale, args.precise)
+        results["scenarios"][name] = result
+        print(f"{name:<14} {result['ticks']:6d} ticks  {result['fps']:9.1f} fps  "
+              f"mean {result['mean_ms']:7.3f} ms  p99 {result['p99_ms']:7.3f} ms  "
+              f"peak {result['peak_kib']:9.1f} KiB")
+
+    if args.entities:
+        results["entities"] = entity_memory()
+        for name, kib in results["entities"].items():
+            print(f"{name:<14} {kib:9.1f} KiB / 10k")
+
+    if args.snapshots:
+        results["snapshots"] = snapshot_cost(args.vector, args.precise)
+        for count, result in results["snapshots"].items():
+            print(f"snapshot {count:>5} bombs  take {result['snapshot_us']:8.1f} us  "
+                  f"restore {result['restore_us']:8.1f} us  size {result['kib']:7.1f} KiB")
+
+    for path in (args.out, args.save_baseline):
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ("vector", "render", "precise"):
+            if baseline.get("meta", {}).get(key) != results["meta"][key]:
+                print(f"注意：基準値と --{key} の指定が違います", file=sys.stderr)
+        failures = compare(results, baseline, args.tolerance)
+        if failures:
+            print(f"\n基準値より {args.tolerance*100:.0f}% 以上悪化しました：", file=sys.stderr)
+            for line in failures:
+                print(f"  FAIL {line}", file=sys.stderr)
+            return 1
+        print("\n基準値との比較：OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+真！こうかとん無双の画像まとめファイルの作成
+PRELOADの画像を読み込み，拡大縮小・回転・反転まで済ませた画素をそのまま1つのファイル（fig/atlas.bin）に並べる．
+ゲームの起動時はこのファイルをメモリマップして切り出すだけでよく，画像ごとのデコードと変換が要らなくなる
+（元の画像ファイルを更新したら作り直す．古いまとめファイルはゲーム側で無視される）
+
+実行例：
+    python build_atlas.py
+"""
+import argparse
+import json
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame as pg
+
+import musou_kokaton as mk
+
+
+ALIGN = mk.Assets.bundle_align
+
+
+def build(out: str, specs=mk.PRELOAD) -> dict:
+    """
+    まとめファイルを作る
+    引数1 out：出力するファイルのパス
+    引数2 specs：Assets.image()の引数の辞書の列
+    戻り値：画像の数とファイルの大きさの辞書
+    """
+    assets = mk.Assets()
+    images, chunks = [], []
+    offset = 0
+    for spec in specs:
+        img = assets.image(**spec)
+        alpha = bool(img.get_flags() & pg.SRCALPHA)
+        fmt = "RGBA" if alpha else "RGB"
+        colorkey = img.get_colorkey()
+        pixels = pg.image.tobytes(img, fmt)
+        pad = -offset % ALIGN
+        chunks.append(b"\0"*pad+pixels)
+        offset += pad
+        images.append({
+            "key": list(assets.key(**spec)),
+            "size": list(img.get_size()),
+            "format": fmt,
+            "colorkey": None if colorkey is None else list(colorkey[:3]),
+            "offset": offset,
+        })
+        offset += len(pixels)
+    sources = {path: os.stat(os.path.join(assets.base, path)).st_mtime_ns for path in assets.raw}
+    index = json.dumps({"sources": sources, "images": images}).encode()
+    header = mk.Assets.bundle_header.pack(mk.Assets.bundle_magic, mk.Assets.bundle_version, len(index))
+    with open(out, "wb") as f:
+        f.write(header)
+        f.write(index)
+        f.write(b"\0"*(-(len(header)+len(index)) % ALIGN))  # 画素データの先頭もそろえる
+        f.writelines(chunks)
+    return {"images": len(images), "bytes": os.path.getsize(out)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="真！こうかとん無双の画像まとめファイルの作成")
+    parser.add_argument("--out", default=mk.BUNDLE, help="出力するファイルのパス")
+    args = parser.parse_args()
+    pg.init()
+    print(build(args.out))
+    pg.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,66 @@
+import argparse
+import array
+import collections
+import csv
+import heapq
+import itertools
+import json
 import math
+import mmap
+import operator
 import os
 import random
+import struct
+import subprocess
 import sys
+import threading
 import time
+import zlib
 import pygame as pg
 
+np = None  # NumPy（importを軽くするため，配列版の弾処理を使うときにload_numpy()で読み込む）
+
 
 WIDTH = 1100  # ゲームウィンドウの幅
 HEIGHT = 650  # ゲームウィンドウの高さ
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+FPS = 50  # ゲームロジックを1秒間に進めるフレーム数（描画のフレームレートとは独立）
+MAX_CATCHUP = 5  # 処理が遅れたときに1回の描画までにまとめて進める最大フレーム数
+EFFECTS_BUDGET = 4.0  # 爆発エフェクトの描画に1フレームで使ってよい時間（ミリ秒）
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # 画像・ステージファイルの置き場所（作業ディレクトリは変えない）
+LEVEL = os.path.join(BASE_DIR, "level", "stage1.json")  # 既定のステージファイル（敵の出現スケジュール）
+BUNDLE = os.path.join(BASE_DIR, "fig", "atlas.bin")  # build_atlas.pyで作る変換済み画像のまとめファイル
+
+# こうかとん1体の1フレーム分の入力を表すビット
+IN_UP, IN_DOWN, IN_LEFT, IN_RIGHT, IN_CHARGE = 1, 2, 4, 8, 16
+MOVE_BITS = ((IN_UP, (0, -1)), (IN_DOWN, (0, +1)), (IN_LEFT, (-1, 0)), (IN_RIGHT, (+1, 0)))  # ビットと移動方向
+MOVE_MASK = IN_UP | IN_DOWN | IN_LEFT | IN_RIGHT
+MOVE_VECS = tuple(  # 移動ビットの組み合わせ → 移動方向（押されたキーの方向の和を事前に計算しておく）
+    (sum(v[0] for bit, v in MOVE_BITS if m & bit), sum(v[1] for bit, v in MOVE_BITS if m & bit))
+    for m in range(MOVE_MASK+1)
+)
+KEYMAPS = (  # こうかとんごとのキーボード割り当て（押下キー → 入力ビット）
+    {pg.K_UP: IN_UP, pg.K_DOWN: IN_DOWN, pg.K_LEFT: IN_LEFT, pg.K_RIGHT: IN_RIGHT, pg.K_SPACE: IN_CHARGE},
+    {pg.K_w: IN_UP, pg.K_s: IN_DOWN, pg.K_a: IN_LEFT, pg.K_d: IN_RIGHT, pg.K_LSHIFT: IN_CHARGE},
+    {pg.K_i: IN_UP, pg.K_k: IN_DOWN, pg.K_j: IN_LEFT, pg.K_l: IN_RIGHT, pg.K_RSHIFT: IN_CHARGE},
+    {pg.K_KP8: IN_UP, pg.K_KP5: IN_DOWN, pg.K_KP4: IN_LEFT, pg.K_KP6: IN_RIGHT, pg.K_KP0: IN_CHARGE},
+)
+PLAYERS = ((3, (300, 200)), (10, (300, 400)), (5, (150, 100)), (7, (150, 550)))  # （画像番号，初期位置）
+MAX_PLAYERS = len(KEYMAPS)
+
+
+def load_numpy():
+    """
+    NumPyを読み込んでモジュール変数npに入れる（読み込み済みなら何もしない）
+    戻り値：numpyモジュール（インストールされていなければNone）
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # NumPyがなければ配列版の弾処理（ProjectileField）は使えない
+            return None
+        np = numpy
+    return np
 
 
 def check_bound(obj_rct: pg.Rect) -> tuple[bool, bool]:
@@ -37,17 +89,710 @@ def calc_orientation(org: pg.Rect, dst: pg.Rect) -> tuple[float, float]:
     return x_diff/norm, y_diff/norm
 
 
-class Bird(pg.sprite.Sprite):
+class Assets:
     """
-    ゲームキャラクター（こうかとん1p）に関するクラス
+    画像ファイルを一度だけ読み込み，拡大縮小・回転・反転済みのSurfaceを
+    キーごとにキャッシュするクラス
+    変換済み画像のまとめファイル（build_atlas.pyで作る）があれば，load_bundle()で一括して読み込める
+    まとめファイル：ヘッダ（識別子，版，索引の長さ）・索引のJSON・画素データの順に並べる
+    （索引の画像ごとの位置は画素データの先頭から数え，各画像はbundle_alignバイト境界から始める）
     """
-    delta = {  # 押下キーと移動量の辞書
-        pg.K_UP: (0, -1),
-        pg.K_DOWN: (0, +1),
-        pg.K_LEFT: (-1, 0),
-        pg.K_RIGHT: (+1, 0),
-    }
+    bundle_magic = b"KKAT"
+    bundle_version = 1
+    bundle_header = struct.Struct("<4sHI")
+    bundle_align = 16
+
+    def __init__(self, base: str = BASE_DIR):
+        """
+        引数 base：画像ファイルの相対パスの基準ディレクトリ
+        """
+        self.base = base
+        self.raw: dict[str, pg.Surface] = {}  # ファイルパス → デコード済みSurface
+        self.variants: dict[tuple, pg.Surface] = {}  # 変換キー → 変換済みSurface
+        self.converted: set[tuple] = set()  # 画面フォーマットに変換済みのキー
+        self.keys: dict[int, tuple] = {}  # キャッシュ中のSurfaceのid → 変換キー
+        self.masks: dict[tuple, pg.mask.Mask] = {}  # 変換キー → 不透明部分のマスク
+        self.solid: dict[tuple[int, int], pg.mask.Mask] = {}  # 大きさ → 全面が当たりのマスク
+        self.hits = 0  # キャッシュヒット数
+        self.misses = 0  # キャッシュミス数
+        self.loads = 0  # ディスクから読み込んだ回数
+        self.bundle: mmap.mmap | None = None  # メモリマップしたまとめファイル（画像が画素を参照している）
+
+    def image(self, path: str, scale: float = 1.0, angle: float = 0,
+              flip: tuple[bool, bool] = (False, False),
+              size: tuple[int, int] | None = None) -> pg.Surface:
+        """
+        変換済みの画像Surfaceを返す（初回のみ読み込み・変換を行う）
+        引数1 path：画像ファイルのパス
+        引数2 scale：rotozoomの拡大率
+        引数3 angle：rotozoomの回転角度
+        引数4 flip：横方向，縦方向の反転有無
+        引数5 size：transform.scaleで指定する大きさ（指定時はscaleより先に適用）
+        戻り値：変換済みSurface（呼び出し側で書き換えないこと）
+        """
+        key = self.key(path, scale, angle, flip, size)
+        img = self.variants.get(key)
+        if img is not None:
+            self.hits += 1
+            return img
+        self.misses += 1
+        img = self._load(path)
+        if size is not None:
+            img = pg.transform.scale(img, size)
+        if scale != 1.0 or angle != 0:
+            img = pg.transform.rotozoom(img, angle, scale)
+        if flip != (False, False):
+            img = pg.transform.flip(img, *flip)
+        self.variants[key] = img
+        self.keys[id(img)] = key
+        self._convert(key)
+        return self.variants[key]
+
+    def circle(self, rad: int, color: tuple[int, int, int]) -> pg.Surface:
+        """
+        塗りつぶした円の画像Surfaceを返す（初回のみ描画・変換を行う）
+        黒を透明色にするので，マスクはmask()で画像ファイルと同じようにキャッシュできる
+        引数1 rad：円の半径
+        引数2 color：円の色
+        戻り値：変換済みSurface（呼び出し側で書き換えないこと）
+        """
+        key = ("circle", rad, color)
+        img = self.variants.get(key)
+        if img is not None:
+            self.hits += 1
+            return img
+        self.misses += 1
+        img = pg.Surface((2*rad, 2*rad))
+        pg.draw.circle(img, color, (rad, rad), rad)
+        img.set_colorkey((0, 0, 0))
+        self.variants[key] = img
+        self.keys[id(img)] = key
+        self._convert(key)
+        return self.variants[key]
+
+    @staticmethod
+    def key(path: str, scale: float = 1.0, angle: float = 0,
+            flip: tuple[bool, bool] = (False, False),
+            size: tuple[int, int] | None = None) -> tuple:
+        """
+        image()と同じ引数から変換キーを返す
+        """
+        return (path, scale, angle, flip, size)
+
+    def _load(self, path: str) -> pg.Surface:
+        """
+        画像ファイルをデコードし，元画像としてキャッシュする
+        引数 path：画像ファイルのパス
+        """
+        if path not in self.raw:
+            self.raw[path] = pg.image.load(os.path.join(self.base, path))
+            self.loads += 1
+        return self.raw[path]
+
+    def load_bundle(self, path: str = BUNDLE) -> int:
+        """
+        まとめファイルをメモリマップし，変換済み画像を切り出してキャッシュに入れる
+        まとめファイルがない・形式が違う・元の画像ファイルの方が新しい場合は何もしない
+        （別スレッドからも呼べるように画面形式への変換はしないので，後でconvert_all()を呼ぶ）
+        引数 path：まとめファイルのパス
+        戻り値：キャッシュに入れた画像の数
+        """
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, length = self.bundle_header.unpack_from(data)
+        if magic != self.bundle_magic or version != self.bundle_version:
+            data.close()
+            return 0
+        start = self.bundle_header.size
+        index = json.loads(data[start:start+length])
+        for src, mtime in index["sources"].items():
+            try:
+                stale = os.stat(os.path.join(self.base, src)).st_mtime_ns > mtime
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                data.close()
+                return 0
+        view = memoryview(data)
+        base = start+length
+        base += -base % self.bundle_align  # 画素データの先頭
+        for entry in index["images"]:
+            path_, scale, angle, flip, size = entry["key"]
+            key = (path_, scale, angle, tuple(flip), None if size is None else tuple(size))
+            if key in self.variants:
+                continue
+            w, h = entry["size"]
+            offset = base+entry["offset"]
+            img = pg.image.frombuffer(view[offset:offset+w*h*len(entry["format"])], (w, h), entry["format"])
+            if entry["colorkey"] is not None:
+                img.set_colorkey(entry["colorkey"])
+            self.variants[key] = img
+            self.keys[id(img)] = key
+        self.bundle = data
+        return len(index["images"])
+
+    def _convert(self, key: tuple):
+        """
+        画面が作られていれば，キャッシュ済みSurfaceを画面のピクセル形式に変換する
+        引数 key：変換するSurfaceのキー
+        """
+        if key in self.converted or pg.display.get_surface() is None:
+            return
+        img = self.variants[key]
+        if img.get_flags() & pg.SRCALPHA:
+            self.variants[key] = img.convert_alpha()
+        else:
+            self.variants[key] = img.convert()
+        del self.keys[id(img)]
+        self.keys[id(self.variants[key])] = key
+        self.converted.add(key)
+
+    def mask(self, img: pg.Surface) -> pg.mask.Mask:
+        """
+        画像の不透明部分のマスクを返す（キャッシュ中の画像は初回だけ作って画像と一緒に保存する）
+        キャッシュにない画像は，画像全体を当たりとするマスクを返す
+        引数 img：マスクを求める画像Surface
+        """
+        key = self.keys.get(id(img))
+        if key is None:
+            size = img.get_size()
+            mask = self.solid.get(size)
+            if mask is None:
+                mask = self.solid[size] = pg.mask.Mask(size, fill=True)
+            return mask
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = self.masks[key] = pg.mask.from_surface(self.variants[key])
+        return mask
+
+    def convert_all(self):
+        """
+        画面生成前にキャッシュされたSurfaceをまとめて画面形式に変換する
+        """
+        for key in list(self.variants):
+            self._convert(key)
+
+    def stats(self) -> dict[str, int]:
+        """
+        キャッシュの利用状況を返す
+        戻り値：ヒット数，ミス数，ディスク読み込み数，キャッシュ数の辞書
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "variants": len(self.variants),
+            "masks": len(self.masks),
+        }
+
+
+ASSETS = Assets()  # ゲーム全体で共有する画像キャッシュ
+PRELOAD = (  # 起動時に読み込んでおく画像（Assets.image()の引数）
+    *({"path": f"fig/{num}.png", "scale": 2.0, "flip": (True, False)} for num, _ in PLAYERS),
+    {"path": "fig/8.png", "scale": 0.9},
+    *({"path": f"fig/alien{i}.png"} for i in range(1, 4)),
+    {"path": "fig/beam.png", "scale": 2.0},
+    {"path": "fig/explosion.gif"},
+    {"path": "fig/explosion.gif", "flip": (True, True)},
+    {"path": "fig/horse.png", "size": (200, 200)},
+    {"path": "fig/boss.png"},
+    {"path": "fig/boss_beam.png"},
+    {"path": "fig/sp.png", "scale": 0.5},
+    {"path": "fig/pg_bg.jpg"},
+    {"path": "fig/pg_bg.jpg", "flip": (True, False)},
+)
+
+
+class Preloader:
+    """
+    画像ファイルのデコードを別スレッドで行い，拡大縮小・画面形式への変換は
+    メインスレッドで行う読み込みのクラス（読み込み中もイベント処理と描画を続けられる）
+    """
+    def __init__(self, assets: Assets, specs=PRELOAD, bundle: str | None = BUNDLE):
+        """
+        引数1 assets：読み込み先の画像キャッシュ
+        引数2 specs：Assets.image()の引数の辞書の列
+        引数3 bundle：先に読み込むまとめファイルのパス（Noneなら画像ファイルだけを読む）
+        """
+        self.assets = assets
+        self.specs = specs
+        self.bundle = bundle
+        self.paths = list(dict.fromkeys(spec["path"] for spec in specs))  # 重複を除いたファイルパス
+        self.done = 0  # デコードが終わったファイル数
+        self.error: Exception | None = None
+        self.timings: dict[str, float] = {}  # 段階ごとの秒数
+        self.thread = threading.Thread(target=self._decode, daemon=True)
+
+    def start(self) -> "Preloader":
+        """
+        デコード用のスレッドを開始する
+        """
+        self.start_time = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def _decode(self):
+        """
+        画像ファイルを順にデコードする（別スレッドで実行される）
+        """
+        try:
+            if self.bundle is not None and self.assets.load_bundle(self.bundle):  # まとめファイルがあれば個別の画像は読み込まなくてよい
+                missing = [spec for spec in self.specs if self.assets.key(**spec) not in self.assets.variants]
+                self.paths = list(dict.fromkeys(spec["path"] for spec in missing))
+            for path in self.paths:
+                self.assets._load(path)
+                self.done += 1
+        except Exception as e:  # メインスレッドのfinish()で投げ直す
+            self.error = e
+        self.timings["decode"] = time.perf_counter()-self.start_time
+
+    def running(self) -> bool:
+        return self.thread.is_alive()
+
+    def progress(self) -> float:
+        """
+        戻り値：デコードが終わった割合（0～1）
+        """
+        return self.done/len(self.paths) if self.paths else 1.0
+
+    def finish(self) -> dict[str, float]:
+        """
+        デコードの終了を待ち，画像を変換してキャッシュに入れる
+        戻り値：デコード・変換・全体の秒数の辞書
+        """
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        start = time.perf_counter()
+        for spec in self.specs:
+            self.assets.image(**spec)
+        self.assets.convert_all()
+        end = time.perf_counter()
+        self.timings["convert"] = end-start
+        self.timings["total"] = end-self.start_time
+        return self.timings
+
+
+class TextCache:
+    """
+    フォントを大きさごとに一度だけ読み込み，描画済みの文字列Surfaceを再利用するクラス
+    """
+    def __init__(self, max_texts: int = 256):
+        """
+        引数 max_texts：キャッシュしておく文字列Surfaceの最大数（古いものから捨てる）
+        """
+        self.fonts: dict[tuple[str | None, int], pg.font.Font] = {}  # （フォント名，大きさ） → フォント
+        self.texts: collections.OrderedDict = collections.OrderedDict()  # 描画キー → 文字列Surface
+        self.max_texts = max_texts
+        self.renders = 0  # render()でフォントから描画した回数
+
+    def font(self, size: int, name: str | None = None) -> pg.font.Font:
+        """
+        フォントを返す（初回のみ読み込む）
+        引数1 size：文字の大きさ
+        引数2 name：フォントファイルのパス（Noneならpygame標準フォント）
+        """
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pg.font.Font(name, size)
+        return font
+
+    def render(self, text: str, size: int, color: tuple[int, int, int], antialias: bool = True) -> pg.Surface:
+        """
+        文字列のSurfaceを返す（同じ文字列・大きさ・色なら描画済みのものを返す）
+        引数1 text：文字列
+        引数2 size：文字の大きさ
+        引数3 color：文字色
+        引数4 antialias：アンチエイリアスの有無
+        戻り値：文字列Surface（呼び出し側で書き換えないこと）
+        """
+        key = (text, size, color, antialias)
+        img = self.texts.get(key)
+        if img is not None:
+            self.texts.move_to_end(key)
+            return img
+        img = self.texts[key] = self.font(size).render(text, antialias, color)
+        self.renders += 1
+        if len(self.texts) > self.max_texts:
+            self.texts.popitem(last=False)
+        return img
+
+    def stats(self) -> dict[str, int]:
+        """
+        キャッシュの利用状況を返す
+        戻り値：フォント数，キャッシュ中の文字列数，render()でフォントから描画した回数の辞書
+        """
+        return {"fonts": len(self.fonts), "texts": len(self.texts), "renders": self.renders}
+
+
+TEXT = TextCache()  # ゲーム全体で共有する文字キャッシュ
+
+
+class NumberLabel:
+    """
+    値が変わったときだけ描き直す数値表示（スコアやHUD用）
+    """
+    def __init__(self, prefix: str, size: int, color: tuple[int, int, int], antialias: bool = True):
+        """
+        引数1 prefix：数値の前に付ける文字列
+        引数2 size：文字の大きさ
+        引数3 color：文字色
+        引数4 antialias：アンチエイリアスの有無
+        """
+        self.prefix = prefix
+        self.size = size
+        self.color = color
+        self.antialias = antialias
+        self.value: int | None = None  # 今の画像に描いてある値
+        self.image: pg.Surface | None = None
+
+    def get(self, value: int) -> pg.Surface:
+        """
+        値を描いたSurfaceを返す（前回と同じ値なら前回のSurfaceを返す）
+        引数 value：表示する値
+        """
+        if value != self.value:  # 値ごとの文字列はキャッシュに入れない（TEXT.renderの文字列を追い出さないように）
+            self.image = TEXT.font(self.size).render(f"{self.prefix}{value}", self.antialias, self.color)
+            self.value = value
+        return self.image
+
+
+def precise_hit(a: pg.sprite.Sprite, b: pg.sprite.Sprite) -> bool:
+    """
+    Rectが重なった2つのスプライトについて，画像の不透明部分どうしが重なっているかを判定する
+    マスクはスプライトのmask属性があればそれを，なければASSETSにキャッシュしたものを使う
+    引数1 a：スプライト（rectとimageを持つもの）
+    引数2 b：相手のスプライト
+    戻り値：不透明部分が重なっていればTrue
+    """
+    mask_a = getattr(a, "mask", None) or ASSETS.mask(a.image)
+    mask_b = getattr(b, "mask", None) or ASSETS.mask(b.image)
+    return mask_a.overlap(mask_b, (b.rect.left-a.rect.left, b.rect.top-a.rect.top)) is not None
+
+
+class BgLayer:
+    """
+    背景画像と左右反転画像をつないだ帯を一度だけ作り，
+    画面に見えている範囲だけを転送する背景レイヤーのクラス
+    """
+    def __init__(self, path: str, speed: float = 1.0):
+        """
+        背景の帯Surfaceを画面のピクセル形式で生成する
+        引数1 path：背景画像ファイルのパス
+        引数2 speed：スクロール量に掛ける倍率（小さいほど奥に見える）
+        """
+        img = ASSETS.image(path)
+        flipped = ASSETS.image(path, flip=(True, False))
+        w, h = img.get_width(), min(img.get_height(), HEIGHT)
+        alpha = bool(img.get_flags() & pg.SRCALPHA)
+        self.strip = pg.Surface((2*w, h), pg.SRCALPHA if alpha else 0)
+        if pg.display.get_surface() is not None:
+            self.strip = self.strip.convert_alpha() if alpha else self.strip.convert()
+        self.strip.blit(img, (0, 0))
+        self.strip.blit(flipped, (w, 0))
+        self.speed = speed
+
+    def draw(self, screen: pg.Surface, scroll: float):
+        """
+        スクロール量に応じた帯の表示範囲を画面に転送する
+        引数1 screen：画面Surface
+        引数2 scroll：背景全体のスクロール量
+        """
+        strip_w = self.strip.get_width()
+        ofs = int(scroll*self.speed) % strip_w
+        h = self.strip.get_height()
+        screen.blit(self.strip, (0, 0), pg.Rect(ofs, 0, WIDTH, h))
+        if ofs+WIDTH > strip_w:  # 帯の終端をまたぐ場合は先頭から残りを転送
+            screen.blit(self.strip, (strip_w-ofs, 0), pg.Rect(0, 0, ofs+WIDTH-strip_w, h))
+
+
+class Background:
+    """
+    速度の異なる複数の背景レイヤーを奥から順に重ねるクラス
+    """
+    def __init__(self, layers: list[tuple[str, float]]):
+        """
+        引数 layers：（画像ファイルのパス，スクロール倍率）のリスト（奥のレイヤーから順）
+        """
+        self.layers = [BgLayer(path, speed) for path, speed in layers]
+
+    def draw(self, screen: pg.Surface, scroll: float):
+        """
+        全レイヤーを画面に転送する
+        引数1 screen：画面Surface
+        引数2 scroll：背景全体のスクロール量
+        """
+        for layer in self.layers:
+            layer.draw(screen, scroll)
+
+
+class Pool:
+    """
+    killされたスプライトを捨てずに取っておき，次の生成時に再利用するクラス
+    Gameごとに持ち，同時に進めるGameどうしでは共有しない（復元時に取り戻したスプライトを他のGameが使っていないように）
+    """
+    def __init__(self, cls: type, cap: int):
+        """
+        引数1 cls：プールするスプライトのクラス（PooledSpriteの子クラス）
+        引数2 cap：取っておくスプライトの最大数
+        """
+        self.cls = cls
+        self.cap = cap
+        self.free: list[pg.sprite.Sprite] = []  # 再利用待ちのスプライト
+        self.allocated = 0  # 新しく生成した数
+        self.reused = 0  # 再利用した数
+        self.dropped = 0  # 上限を超えて捨てた数
+
+    def acquire(self, *args, **kwargs) -> pg.sprite.Sprite:
+        """
+        再利用待ちのスプライトがあれば初期化し直して返し，なければ生成する
+        引数：スプライトのコンストラクタと同じ引数
+        """
+        if self.free:
+            obj = self.free.pop()
+            obj.prev_topleft = None  # 再利用前の位置から補間描画しないようにする
+            obj.reset(*args, **kwargs)
+            self.reused += 1
+            return obj
+        self.allocated += 1
+        obj = self.cls(*args, **kwargs)
+        obj.pool = self  # killされたらこのプールに戻す
+        return obj
+
+    def release(self, obj: pg.sprite.Sprite):
+        """
+        killされたスプライトを再利用待ちに戻す
+        引数 obj：戻すスプライト
+        """
+        if len(self.free) < self.cap:
+            self.free.append(obj)
+        else:
+            self.dropped += 1
+
+    def discard(self, ids: set[int]):
+        """
+        スナップショットから復元して生存に戻したスプライトを再利用待ちから外す
+        引数 ids：生存に戻したスプライトのidの集合
+        """
+        self.free = [obj for obj in self.free if id(obj) not in ids]
+
+    def stats(self) -> dict[str, int]:
+        """
+        プールの利用状況を返す
+        戻り値：生成数，再利用数，破棄数，待機数，上限の辞書
+        """
+        return {
+            "allocated": self.allocated,
+            "reused": self.reused,
+            "dropped": self.dropped,
+            "free": len(self.free),
+            "cap": self.cap,
+        }
+
+
+class Entity(pg.sprite.Sprite):
+    """
+    大量に生成されるスプライトの基底クラス
+    インスタンスごとに変わる状態だけを__slots__に持ち，__dict__を作らない
+    種類ごとに変わらないデータ（速さ・ダメージなど）は子クラスのクラス属性に置いて共有する
+    （pg.sprite.Spriteが__slots__を持たないので__dict__自体は残り，ステージファイルのparamsなど
+    __slots__にない属性を書き込んだときだけ作られる）
+    所属グループはpygame内部の属性（版によってsetやdict）を使わず，自前の_groupsに持つ．
+    グループ側から呼ばれるadd_internal・remove_internalと，所属グループを使うメソッドをすべて上書きする
+    """
+    __slots__ = ("_groups", "image", "rect", "prev_topleft")
+
+    def __init__(self, *groups):
+        # 所属グループはたいてい1つなので，setの代わりにlistで持つ（空のsetは216バイト）
+        self._groups: list[pg.sprite.AbstractGroup] = []
+        self.prev_topleft = None  # スナップショットでattrgetterを使えるように，全属性を必ず設定しておく
+        if groups:
+            self.add(*groups)
+
+    def add(self, *groups):
+        for group in groups:
+            if hasattr(group, "_spritegroup"):
+                if group not in self._groups:
+                    group.add_internal(self)
+                    self.add_internal(group)
+            else:
+                self.add(*group)
+
+    def remove(self, *groups):
+        for group in groups:
+            if hasattr(group, "_spritegroup"):
+                if group in self._groups:
+                    group.remove_internal(self)
+                    self.remove_internal(group)
+            else:
+                self.remove(*group)
+
+    def add_internal(self, group: pg.sprite.AbstractGroup):
+        self._groups.append(group)
+
+    def remove_internal(self, group: pg.sprite.AbstractGroup):
+        self._groups.remove(group)
+
+    def kill(self):
+        for group in self._groups:
+            group.remove_internal(self)
+        self._groups.clear()
+
+    def groups(self) -> list[pg.sprite.AbstractGroup]:
+        return list(self._groups)
+
+    def alive(self) -> bool:
+        return bool(self._groups)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} Sprite(in {len(self._groups)} groups)>"
+
+
+class PooledSprite(Entity):
+    """
+    Poolで使い回すスプライトの基底クラス
+    子クラスは__init__の処理をreset()に書き，spawn()で生成する
+    （reset()は子クラスで必ず定義する．__init__とPool.acquire()がコンストラクタの引数をそのまま渡す）
+    """
+    __slots__ = ("pool",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.pool: Pool | None = None  # 生成したPool（プールを使わずに生成したらNone）
+        self.reset(*args, **kwargs)
+
+    @classmethod
+    def spawn(cls, pools: dict[type, Pool] | None, *args, **kwargs) -> "PooledSprite":
+        """
+        プールがあれば再利用し，なければ新しく生成する
+        引数1 pools：Gameのプール（クラス → Pool，Noneならプールを使わない）
+        引数2以降：スプライトのコンストラクタと同じ引数
+        """
+        pool = pools.get(cls) if pools is not None else None
+        if pool is None:
+            return cls(*args, **kwargs)
+        return pool.acquire(*args, **kwargs)
+
+    def kill(self):
+        """
+        全グループから外し，プールに戻す
+        """
+        was_alive = self.alive()
+        super().kill()
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
 
+    def recycle(self):
+        """
+        グループに入れずに使い終えたスプライトをプールに戻す
+        """
+        if self.pool is not None and not self.alive():
+            self.pool.release(self)
+
+
+_STATE_ACCESS: dict[type, tuple] = {}  # クラス → （属性を取り出す関数，属性を戻す関数）
+_UNSET = object()  # スナップショットの時点で値がなかった属性の印
+
+
+def _state_access(cls: type) -> tuple:
+    """
+    スプライトのクラスごとに，所属グループとRect以外の属性を取り出す関数と戻す関数を返す
+    Entityの子クラスは__slots__の属性がすべて設定済みなので，attrgetterで1回の呼び出しで取り出す
+    （Entityの__dict__は出現時にステージファイルのparamsを書くだけで後から変わらないので写さない）
+    それ以外のクラスは__slots__の値と__dict__の写しを取り出す
+    引数 cls：スプライトのクラス
+    戻り値：（スプライト → 値，（スプライト，値） → None）の関数のタプル
+    """
+    access = _STATE_ACCESS.get(cls)
+    if access is not None:
+        return access
+    names = []
+    for klass in reversed(cls.__mro__):
+        for name in klass.__dict__.get("__slots__", ()):
+            if name not in ("_groups", "rect", "__dict__", "__weakref__") and name not in names:
+                names.append(name)
+    names = tuple(names)
+
+    if issubclass(cls, Entity):  # 少なくともimageとprev_topleftがあるので，attrgetterはタプルを返す
+        get = operator.attrgetter(*names)
+
+        def put(sprite: Entity, values: tuple):
+            for name, value in zip(names, values):
+                setattr(sprite, name, value)
+    else:
+        def get(sprite: pg.sprite.Sprite) -> tuple:
+            attrs = getattr(sprite, "__dict__", None)
+            extra = {k: v for k, v in attrs.items() if k not in ("_Sprite__g", "rect")} if attrs else None
+            return tuple(getattr(sprite, name, _UNSET) for name in names), extra
+
+        def put(sprite: pg.sprite.Sprite, state: tuple):
+            values, extra = state
+            for name, value in zip(names, values):
+                if value is not _UNSET:
+                    setattr(sprite, name, value)
+                elif hasattr(sprite, name):
+                    delattr(sprite, name)
+            if extra is not None:
+                sprite.__dict__.update(extra)
+
+    access = _STATE_ACCESS[cls] = (get, put)
+    return access
+
+
+class SpriteStates:
+    """
+    スプライトの並びと，ある時点でのそれぞれの属性をまとめて持つクラス（GameStateの部品）
+    スプライト自体は複製せずに参照し，書き換えられるRectだけを座標と大きさの配列に詰める
+    画像・マスク・見た目のキーなどの値は写さずに共有する
+    """
+    __slots__ = ("sprites", "rects", "values")
+
+    def __init__(self, sprites: pg.sprite.AbstractGroup | list[pg.sprite.Sprite]):
+        """
+        引数 sprites：状態を取り出すスプライト（並び順も保存する）
+        """
+        self.sprites = tuple(sprites)
+        self.rects = array.array("i", itertools.chain.from_iterable(sprite.rect for sprite in self.sprites))
+        getters = {}  # グループ内はたいてい同じクラスなので，クラスごとの関数を引くのは1回だけ
+        values = []
+        for sprite in self.sprites:
+            cls = type(sprite)
+            get = getters.get(cls)
+            if get is None:
+                get = getters[cls] = _state_access(cls)[0]
+            values.append(get(sprite))
+        self.values = values
+
+    def restore(self) -> tuple[pg.sprite.Sprite, ...]:
+        """
+        各スプライトの属性とRectを取り出した時点に戻す（所属グループは変えない）
+        戻り値：戻したスプライトのタプル
+        """
+        it = iter(self.rects)
+        putters = {}
+        for sprite, values, x, y, w, h in zip(self.sprites, self.values, it, it, it, it):
+            cls = type(sprite)
+            put = putters.get(cls)
+            if put is None:
+                put = putters[cls] = _state_access(cls)[1]
+            put(sprite, values)
+            sprite.rect = pg.Rect(x, y, w, h)
+        return self.sprites
+
+    def __len__(self) -> int:
+        return len(self.sprites)
+
+
+class Bird(pg.sprite.Sprite):
+    """
+    ゲームキャラクター（こうかとん）に関するクラス
+    何人目のこうかとんでも同じクラスで，入力ビットだけで動かす（入力の読み取りはInputBinding側）
+    """
     def __init__(self, num: int, xy: tuple[int, int]):
         """
         こうかとん画像Surfaceを生成する
@@ -55,8 +800,7 @@ class Bird(pg.sprite.Sprite):
         引数2 xy：こうかとん画像の位置座標タプル
         """
         super().__init__()
-        img0 = pg.transform.rotozoom(pg.image.load(f"fig/{num}.png"), 0, 2.0)
-        self.img = pg.transform.flip(img0, True, False)  # デフォルトのこうかとん
+        self.img = ASSETS.image(f"fig/{num}.png", 2.0, flip=(True, False))  # デフォルトのこうかとん
         self.charge_time = 0  # チャージ時間を管理する変数を追加
         self.is_charging = False  # チャージ状態かどうか
         self.state="alive"
@@ -77,157 +821,231 @@ class Bird(pg.sprite.Sprite):
             return True  # チャージショット発射信号
         return False
     
-    def draw_charge_effect(self, screen: pg.Surface):
+    def draw_charge_effect(self, screen: pg.Surface, center: tuple[int, int] | None = None):
         if self.is_charging:
             radius = min(50, self.charge_time)  # チャージ時間に応じた半径
-            pg.draw.circle(screen, (255, 0, 255), self.rect.center, radius, 2)  # チャージエフェクト
-
+            pg.draw.circle(screen, (255, 0, 255), center or self.rect.center, radius, 2)  # チャージエフェクト
 
-    def change_img(self, num: int, screen: pg.Surface):
+    def update(self, inp: int):
         """
-        こうかとん画像を切り替え，画面に転送する
-        引数1 num：こうかとん画像ファイル名の番号
-        引数2 screen：画面Surface
+        入力ビットに応じてこうかとんを移動させる
+        画面外に出る方向の移動だけを取り消す
+        引数 inp：このフレームの入力ビット
         """
-        #pg.transform.rotozoom(pg.image.load(f"fig/{num}.png"), 0, 2.0)
         if self.state=="alive":
-            screen.blit(self.image, self.rect)
-
-    def update(self, key_lst: list[bool], screen: pg.Surface):
+            mv = MOVE_VECS[inp & MOVE_MASK]
+            if mv != (0, 0):
+                dx, dy = self.speed*mv[0], self.speed*mv[1]
+                rct = self.rect
+                if rct.left+dx < 0 or WIDTH < rct.right+dx:
+                    dx = 0
+                if rct.top+dy < 0 or HEIGHT < rct.bottom+dy:
+                    dy = 0
+                rct.move_ip(dx, dy)
+                self.dire = mv
+
+    def draw(self, screen: pg.Surface, rect: pg.Rect | None = None):
         """
-        押下キーに応じてこうかとんを移動させる
-        引数1 key_lst：押下キーの真理値リスト
-        引数2 screen：画面Surface
+        生存中のこうかとんとチャージエフェクトを画面に転送する
+        引数1 screen：画面Surface
+        引数2 rect：描画位置（補間描画用，Noneなら現在位置）
         """
         if self.state=="alive":
-            sum_mv = [0, 0]
-            for k, mv in __class__.delta.items():
-                if key_lst[k]:
-                    sum_mv[0] += mv[0]
-                    sum_mv[1] += mv[1]
-            self.rect.move_ip(self.speed*sum_mv[0], self.speed*sum_mv[1])
-            if check_bound(self.rect) == (False, True):
-                self.rect.move_ip(-self.speed*sum_mv[0], 0)
-            if check_bound(self.rect) == (True, False):
-                self.rect.move_ip(0, -self.speed*sum_mv[1])
-            if check_bound(self.rect) == (False, False):
-                self.rect.move_ip(-self.speed*sum_mv[0], -self.speed*sum_mv[1])
-            if not (sum_mv[0] == 0 and sum_mv[1] == 0):
-                self.dire = tuple(sum_mv)
-                self.image = self.img
-            screen.blit(self.image, self.rect)
-            self.draw_charge_effect(screen)
+            rect = self.rect if rect is None else rect
+            screen.blit(self.image, rect)
+            self.draw_charge_effect(screen, rect.center)
 
     def dead(self):
         self.state="dead"
 
-class Bird_2p(pg.sprite.Sprite):
+
+class KeyboardInput:
     """
-    ゲームキャラクター（こうかとん2p）に関するクラス
+    キーボードの押下状態を入力ビットに変換する入力設定
     """
-    delta = {  # 押下キーと移動量の辞書
-        pg.K_w: (0, -1),
-        pg.K_s: (0, +1),
-        pg.K_a: (-1, 0),
-        pg.K_d: (+1, 0),
-    }
+    def __init__(self, keymap: dict[int, int]):
+        """
+        引数 keymap：押下キー → 入力ビット の辞書
+        """
+        self.keymap = tuple(keymap.items())
 
-    def __init__(self, num: int, xy: tuple[int, int]):
+    def read(self, key_lst, tmr: int) -> int:
         """
-        こうかとん画像Surfaceを生成する
-        引数1 num：こうかとん画像ファイル名の番号
-        引数2 xy：こうかとん画像の位置座標タプル
+        このフレームの入力ビットを返す
+        引数1 key_lst：押下キーの真理値リスト
+        引数2 tmr：ゲームのフレーム数
         """
-        img0 = pg.transform.rotozoom(pg.image.load(f"fig/{num}.png"), 0, 2.0)
-        self.img = pg.transform.flip(img0, True, False)  # デフォルトのこうかとん
-        self.charge_time = 0  # チャージ時間を管理する変数を追加
-        self.is_charging = False  # チャージ状態かどうか
-        self.state="alive"
-        self.dire = (1, 0)
-        self.image = self.img
-        self.rect = self.image.get_rect()
-        self.rect.center = xy
-        self.speed = 10
+        return sum(bit for k, bit in self.keymap if key_lst[k])
 
-    def start_charging(self):
-        self.is_charging = True
-        self.charge_time = 0  # チャージを開始するときにリセット
 
-    def stop_charging(self):
-        self.is_charging = False
-        if self.charge_time > 50:  # チャージ時間が一定以上ならチャージショット発射
-            return True  # チャージショット発射信号
-        return False
-    
-    def draw_charge_effect(self, screen: pg.Surface):
-        if self.is_charging:
-            radius = min(50, self.charge_time)  # チャージ時間に応じた半径
-            pg.draw.circle(screen, (255, 0, 255), self.rect.center, radius, 2)  # チャージエフェクト
+class JoystickInput:
+    """
+    ジョイスティック（ゲームパッド）の軸・ハット・ボタンを入力ビットに変換する入力設定
+    """
+    def __init__(self, index: int, dead_zone: float = 0.5, charge_button: int = 0):
+        """
+        引数1 index：ジョイスティックの番号
+        引数2 dead_zone：軸の傾きをこれ以下なら無視する
+        引数3 charge_button：チャージショットのボタン番号
+        """
+        self.joy = pg.joystick.Joystick(index)
+        self.dead_zone = dead_zone
+        self.charge_button = charge_button
 
+    def read(self, key_lst, tmr: int) -> int:
+        """
+        このフレームの入力ビットを返す
+        引数1 key_lst：押下キーの真理値リスト（使わない）
+        引数2 tmr：ゲームのフレーム数
+        """
+        joy = self.joy
+        x, y = joy.get_axis(0), joy.get_axis(1)
+        if joy.get_numhats() > 0:
+            hx, hy = joy.get_hat(0)
+            x, y = x+hx, y-hy
+        inp = 0
+        if x < -self.dead_zone:
+            inp |= IN_LEFT
+        elif x > self.dead_zone:
+            inp |= IN_RIGHT
+        if y < -self.dead_zone:
+            inp |= IN_UP
+        elif y > self.dead_zone:
+            inp |= IN_DOWN
+        if joy.get_numbuttons() > self.charge_button and joy.get_button(self.charge_button):
+            inp |= IN_CHARGE
+        return inp
+
+
+class BotInput:
+    """
+    乱数で動き回り，ときどきチャージショットを撃つ自動操作の入力設定（耐久テストやバランス確認用）
+    """
+    moves = (0, IN_UP, IN_DOWN, IN_LEFT, IN_RIGHT, IN_UP|IN_LEFT, IN_UP|IN_RIGHT, IN_DOWN|IN_LEFT, IN_DOWN|IN_RIGHT)
 
-    def change_img(self, num: int, screen: pg.Surface):
+    def __init__(self, seed: int | None = None, interval: int = 25):
         """
-        こうかとん画像を切り替え，画面に転送する
-        引数1 num：こうかとん画像ファイル名の番号
-        引数2 screen：画面Surface
+        引数1 seed：乱数のシード（同じシードなら同じ操作になる）
+        引数2 interval：操作を切り替えるフレーム間隔
         """
-        #pg.transform.rotozoom(pg.image.load(f"fig/{num}.png"), 0, 2.0)
-        if self.state=="alive":
-            screen.blit(self.image, self.rect)
+        self.rng = random.Random(seed)
+        self.interval = interval
+        self.inp = 0
 
-    def update(self, key_lst: list[bool], screen: pg.Surface):
+    def read(self, key_lst, tmr: int) -> int:
         """
-        押下キーに応じてこうかとんを移動させる
-        引数1 key_lst：押下キーの真理値リスト
-        引数2 screen：画面Surface
+        このフレームの入力ビットを返す
+        引数1 key_lst：押下キーの真理値リスト（使わない）
+        引数2 tmr：ゲームのフレーム数
         """
-        if self.state=="alive":
-            sum_mv = [0, 0]
-            for k, mv in __class__.delta.items():
-                if key_lst[k]:
-                    sum_mv[0] += mv[0]
-                    sum_mv[1] += mv[1]
-            self.rect.move_ip(self.speed*sum_mv[0], self.speed*sum_mv[1])
-            if check_bound(self.rect) == (False, True):
-                self.rect.move_ip(-self.speed*sum_mv[0], 0)
-            if check_bound(self.rect) == (True, False):
-                self.rect.move_ip(0, -self.speed*sum_mv[1])
-            if check_bound(self.rect) == (False, False):
-                self.rect.move_ip(-self.speed*sum_mv[0], -self.speed*sum_mv[1])
-            if not (sum_mv[0] == 0 and sum_mv[1] == 0):
-                self.dire = tuple(sum_mv)
-                self.image = self.img
-            screen.blit(self.image, self.rect)
-            self.draw_charge_effect(screen)
-    
-    def dead(self):
-        self.state="dead"
+        if tmr % self.interval == 0:
+            charge = self.inp & IN_CHARGE
+            if self.rng.random() < 0.3:
+                charge ^= IN_CHARGE  # チャージの開始・解放
+            self.inp = self.rng.choice(self.moves) | charge
+        return self.inp
+
+
+class ReplayInput:
+    """
+    リプレイに記録された1人分の入力を返す入力設定
+    """
+    def __init__(self, replay: "Replay", player: int):
+        """
+        引数1 replay：再生するリプレイ
+        引数2 player：何人目の入力か（0から）
+        """
+        self.replay = replay
+        self.player = player
+
+    def read(self, key_lst, tmr: int) -> int:
+        """
+        このフレームの入力ビットを返す
+        引数1 key_lst：押下キーの真理値リスト（使わない）
+        引数2 tmr：ゲームのフレーム数
+        """
+        return self.replay.inputs_at(tmr)[self.player]
+
+
+def input_bindings(players: int, bots: bool = False, seed: int | None = None) -> list:
+    """
+    人数分の入力設定を作る
+    キーボードの割り当て（KEYMAPS）を前から使い，接続されたジョイスティックがあれば後ろの人に割り当てる
+    引数1 players：こうかとんの数
+    引数2 bots：Trueなら全員を自動操作にする
+    引数3 seed：自動操作の乱数のシード（1人ずつずらして使う）
+    戻り値：人数分の入力設定のリスト
+    """
+    if bots:
+        return [BotInput(None if seed is None else seed+i) for i in range(players)]
+    joysticks = pg.joystick.get_count() if pg.joystick.get_init() else 0
+    bindings = []
+    for i in range(players):
+        j = i-(players-joysticks)
+        bindings.append(JoystickInput(j) if j >= 0 else KeyboardInput(KEYMAPS[i]))
+    return bindings
 
 
-class Bomb(pg.sprite.Sprite):
+class Bomb(PooledSprite):
     """
     爆弾に関するクラス
     """
+    __slots__ = ("mask", "look", "vx", "vy")
     colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+    radii = range(10, 51)  # 爆弾円の半径：10以上50以下
+    speed = 10
+    damage = 1
+    looks: dict[tuple, tuple] = {}  # （半径，色） → （画像，マスク，Rectの雛形，見た目のキー）を全爆弾で共有
 
-    def __init__(self, emy: "Enemy", bird: "Bird"):
+    @classmethod
+    def look_of(cls, rad: int, color: tuple[int, int, int]) -> tuple:
+        """
+        半径と色に対応する見た目を返す（なければ描画してキャッシュする）
+        引数1 rad：爆弾円の半径
+        引数2 color：爆弾円の色
+        戻り値：画像，マスク，Rectの雛形，見た目のキーのタプル
+        """
+        look = cls.looks.get((rad, color))
+        if look is None:
+            img = ASSETS.circle(rad, color)
+            look = cls.looks[(rad, color)] = (img, ASSETS.mask(img), img.get_rect(), (rad, color))
+        return look
+
+    @classmethod
+    def prerender(cls) -> float:
+        """
+        すべての半径と色の組み合わせを画面形式で描画しておく（画面の生成後に呼ぶ）
+        戻り値：かかった秒数
         """
-        爆弾円Surfaceを生成する
+        start = time.perf_counter()
+        cls.looks.clear()  # 画面形式に変換する前の画像を参照していたら作り直す
+        ASSETS.convert_all()
+        for rad in cls.radii:
+            for color in cls.colors:
+                cls.look_of(rad, color)
+        return time.perf_counter()-start
+
+    def reset(self, emy: "Enemy", bird: "Bird", rng: random.Random = random):
+        """
+        爆弾円の見た目を選ぶ（画像・マスクは描画済みのものを共有し，Rectだけ雛形から複製する）
         引数1 emy：爆弾を投下する敵機
         引数2 bird：攻撃対象のこうかとん
+        引数3 rng：半径と色を決める乱数生成器
         """
-        super().__init__()
-        rad = random.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
-        self.image = pg.Surface((2*rad, 2*rad))
-        color = random.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
-        pg.draw.circle(self.image, color, (rad, rad), rad)
-        self.image.set_colorkey((0, 0, 0))
-        self.rect = self.image.get_rect()
+        rad = rng.choice(__class__.radii)  # 爆弾円の半径：描画済みの半径から選ぶ（randint(10, 50)と同じ乱数の使い方）
+        color = rng.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
+        self.image, self.mask, rect, self.look = __class__.look_of(rad, color)  # lookは見た目を表すキー
+        self.rect = rect.copy()
         # 爆弾を投下するemyから見た攻撃対象のbirdの方向を計算
         self.vx, self.vy = calc_orientation(emy.rect, bird.rect)  
         self.rect.centerx = emy.rect.centerx
         self.rect.centery = emy.rect.centery+emy.rect.height//2
-        self.speed = 10
+
+    def velocity(self) -> tuple[float, float]:
+        """
+        1フレームあたりの移動量を返す
+        """
+        return self.speed*self.vx, self.speed*self.vy
 
     def update(self):
         """
@@ -239,22 +1057,22 @@ class Bomb(pg.sprite.Sprite):
             self.kill()
 
 
-class Beam(pg.sprite.Sprite):
+class Beam(PooledSprite):
     """
     ビームに関するクラス
     """
-    def __init__(self, bird: Bird, is_charge_shot = False):
+    __slots__ = ("speed", "damage")
+    angle = math.degrees(math.atan2(-0, 1))  # 発射方向（右向き）
+    vx, vy = math.cos(math.radians(angle)), -math.sin(math.radians(angle))
+    look = ("beam", angle)  # 見た目を表すキー
+
+    def reset(self, bird: Bird, is_charge_shot = False):
         """
         ビーム画像Surfaceを生成する
         引数1 bird：ビームを放つこうかとん
-        引数2 angle0：複数発射時の角度
+        引数2 is_charge_shot：チャージショットかどうか
         """
-        super().__init__()
-        self.vx, self.vy = 1,0
-        angle = math.degrees(math.atan2(-self.vy, self.vx))
-        self.image = pg.transform.rotozoom(pg.image.load(f"fig/beam.png"), angle, 2.0)
-        self.vx = math.cos(math.radians(angle))
-        self.vy = -math.sin(math.radians(angle))
+        self.image = ASSETS.image("fig/beam.png", 2.0, self.angle)
         #self.rect = self.image.get_rect()
         self.speed = 10 if not is_charge_shot else 20 #通常ショットとチャージショットとの速さの違い
         self.damage = 1 if not is_charge_shot else 5  # チャージショットのダメージ
@@ -262,6 +1080,12 @@ class Beam(pg.sprite.Sprite):
         self.rect.centery = bird.rect.centery + bird.rect.height * self.vy 
         self.rect.centerx = bird.rect.centerx + bird.rect.width * self.vx 
 
+    def velocity(self) -> tuple[float, float]:
+        """
+        1フレームあたりの移動量を返す
+        """
+        return self.speed*self.vx, self.speed*self.vy
+
     def update(self):
         """
         ビームを速度ベクトルself.vx, self.vyに基づき移動させる
@@ -273,90 +1097,71 @@ class Beam(pg.sprite.Sprite):
 
 
 
-class Explosion(pg.sprite.Sprite):
+class Enemy(Entity):
     """
-    爆発に関するクラス
+    敵機に関するクラス
     """
-    def __init__(self, obj: "Bomb|Enemy|Boss", life: int):
-        """
-        爆弾が爆発するエフェクトを生成する
-        引数1 obj：爆発するBombまたは敵機インスタンス
-        引数2 life：爆発時間
-        """
-        super().__init__()
-        img = pg.image.load(f"fig/explosion.gif")
-        self.imgs = [img, pg.transform.flip(img, 1, 1)]
-        self.image = self.imgs[0]
-        self.rect = self.image.get_rect(center=obj.rect.center)
-        self.life = life
-
-    def update(self):
+    __slots__ = ("bound", "state", "interval")
+    despawn_margin = 100  # 画面外にこれ以上出たら消す距離
+    vx, vy = -6, 0
+    def __init__(self, rng: random.Random = random):
         """
-        爆発時間を1減算した爆発経過時間_lifeに応じて爆発画像を切り替えることで
-        爆発エフェクトを表現する
+        引数 rng：画像と出現位置を決める乱数生成器
         """
-        self.life -= 1
-        self.image = self.imgs[self.life//10%2]
-        if self.life < 0:
-            self.kill()
-
-
-class Enemy(pg.sprite.Sprite):
-    """
-    敵機に関するクラス
-    """
-    imgs = [pg.image.load(f"fig/alien{i}.png") for i in range(1, 4)]
-    
-    def __init__(self):
         super().__init__()
-        self.image = random.choice(__class__.imgs)
+        self.image = ASSETS.image(f"fig/alien{rng.randint(1, 3)}.png")
         self.rect = self.image.get_rect()
-        self.rect.center =WIDTH, random.randint(100, HEIGHT-100)
-        self.vx, self.vy = -6, 0
-        self.bound = random.randint(50, HEIGHT//2)  # 停止位置
+        self.rect.center =WIDTH, rng.randint(100, HEIGHT-100)
+        self.bound = rng.randint(50, HEIGHT//2)  # 停止位置
         self.state = "down"  # 降下状態or停止状態
-        self.interval = random.randint(50, 300)  # 爆弾投下インターバル
+        self.interval = rng.randint(50, 300)  # 爆弾投下インターバル
 
     def update(self):
         self.rect.move_ip(self.vx, self.vy)
 
-class Bomb_Enemy(pg.sprite.Sprite):
+class Bomb_Enemy(Entity):
     """
     敵機に関するクラス
     """
-    imgs = [pg.image.load(f"fig/alien{i}.png") for i in range(1, 4)]
-    
-    def __init__(self):
+    __slots__ = ("state",)
+    despawn_margin = 100  # 画面外にこれ以上出たら消す距離
+    vx, vy = 0, 0
+    interval = 5  # 爆弾投下インターバル
+    def __init__(self, rng: random.Random = random):
+        """
+        引数 rng：画像と出現位置を決める乱数生成器
+        """
         super().__init__()
-        self.image = random.choice(__class__.imgs)
+        self.image = ASSETS.image(f"fig/alien{rng.randint(1, 3)}.png")
         self.rect = self.image.get_rect()
-        self.rect.center =WIDTH-10, random.randint(100, HEIGHT-100)
-        self.vx, self.vy = 0, 0
+        self.rect.center =WIDTH-10, rng.randint(100, HEIGHT-100)
         self.state = "start"  # 降下状態or停止状態
-        self.interval = 5  # 爆弾投下インターバル
 
     def update(self):
         self.rect.move_ip(self.vx, self.vy)
         self.state="stop"
         
-class Super_Enemy(pg.sprite.Sprite):
+class Super_Enemy(Entity):
     """
     敵機に関するクラス
     """
-    img = pg.image.load("fig/horse.png") 
-    img = pg.transform.scale(img,(200,200))
-
-    def __init__(self, hp:int):
+    __slots__ = ("lifestate", "hp", "state", "count")
+    despawn_margin = 200  # 画面外にこれ以上出たら消す距離
+    vx, vy = -50, 0
+    interval = 70  # 爆弾投下インターバル
+    def __init__(self, hp:int, rng: random.Random = random):
+        """
+        引数1 hp：体力
+        引数2 rng：出現位置を決める乱数生成器
+        """
         super().__init__()
-        self.image = __class__.img
+        self.image = ASSETS.image("fig/horse.png", size=(200, 200))
         #self.image = pg.Surface((100, 100))
         self.rect = self.image.get_rect()
         self.lifestate="alive"
         self.hp = hp
-        self.rect.center =WIDTH, random.randint(50, HEIGHT-50)
-        self.vx, self.vy = -50, 0
+        self.rect.center =WIDTH, rng.randint(50, HEIGHT-50)
         self.state = "stop"  # 降下状態or停止状態
-        self.interval = 70  # 爆弾投下インターバル
         self.count = 0
 
     def update(self):
@@ -376,13 +1181,17 @@ class Boss(pg.sprite.Sprite):
     """
     ボスに関するクラス
     """
-    
+    despawn_margin = 500  # 画面外にこれ以上出たら消す距離
 
-    def __init__(self, beams_group):
+    def __init__(self, beams_group, pools: dict[type, Pool] | None = None):
+        """
+        引数1 beams_group：撃ったBossBeamを入れるグループ
+        引数2 pools：BossBeamを再利用するGameのプール（Noneならプールを使わない）
+        """
         super().__init__()
         self.beams_group = beams_group
-        img = pg.image.load(f"fig/boss.png")
-        self.img = pg.transform.flip(img, False, False)
+        self.pools = pools
+        self.img = ASSETS.image("fig/boss.png")
         self.image = self.img
         self.rect = self.image.get_rect()
         self.rect.center =WIDTH, HEIGHT/2
@@ -402,25 +1211,52 @@ class Boss(pg.sprite.Sprite):
 
         if self.state == "stopped":
             if tmr - self.last_shot_time >= self.beam_interval:
-                self.beams_group.add(BossBeam(self))
+                self.beams_group.add(BossBeam.spawn(self.pools, self))
                 self.last_shot_time = tmr
 
 
-class BossBeam(pg.sprite.Sprite):
-    def __init__(self, boss: Boss):
-        super().__init__()
-        self.image = pg.transform.rotozoom(pg.image.load(f"fig/boss_beam.png"), 0, 1.0)
+class BossBeam(PooledSprite):
+    """
+    ボスが放つビームに関するクラス
+    """
+    __slots__ = ()
+    look = "boss_beam"  # 見た目を表すキー
+    vx = -6
+    damage = 1
+
+    def reset(self, boss: Boss):
+        self.image = ASSETS.image("fig/boss_beam.png")
         self.rect = self.image.get_rect()
         self.rect.centerx = boss.rect.centerx
         self.rect.centery = boss.rect.centery
-        self.vx = -6
 
-    def update(self):
-        self.rect.move_ip(self.vx, 0)
+    def velocity(self) -> tuple[float, float]:
+        """
+        1フレームあたりの移動量を返す
+        """
+        return self.vx, 0
+
+    def update(self):
+        self.rect.move_ip(self.vx, 0)
         if check_bound(self.rect) != (True, True):
             self.kill()
 
 
+POOL_CAPS = {  # 短命なスプライトのプールに取っておく最大数（クラス → 上限）
+    Beam: 256,
+    Bomb: 512,
+    BossBeam: 64,
+}
+
+
+def new_pools() -> dict[type, Pool]:
+    """
+    POOL_CAPSの種類ごとに空のプールを作る
+    戻り値：クラス → Poolの辞書（Gameに渡す）
+    """
+    return {cls: Pool(cls, cap) for cls, cap in POOL_CAPS.items()}
+
+
 class Score:
     """
     打ち落とした爆弾，敵機の数をスコアとして表示するクラス
@@ -428,273 +1264,1873 @@ class Score:
     敵機：10点
     """
     def __init__(self):
-        self.font = pg.font.Font(None, 50)
         self.color = (0, 0, 255)
         self.value = 0
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
+        self.label = NumberLabel("Score: ", 50, self.color, False)  # スコアが変わったときだけ描き直す
+        self.image = self.label.get(self.value)
         self.rect = self.image.get_rect()
         self.rect.center = 100, HEIGHT-50
 
     def update(self, screen: pg.Surface):
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
+        self.image = self.label.get(self.value)
         screen.blit(self.image, self.rect)
 
 
 
 
-class Item(pg.sprite.Sprite):
+class Item(Entity):
     """
     アイテムに関するクラス
     """
+    __slots__ = ("life",)
     def __init__(self, position: tuple[int, int]):
         """
         アイテムの初期設定
         引数1 position：アイテムが出現する座標
         """
         super().__init__()
-        self.image = pg.transform.rotozoom(pg.image.load("fig/sp.png"), 0, 0.5)
+        self.image = ASSETS.image("fig/sp.png", 0.5)
         self.rect = self.image.get_rect(center=position)
-        self.spawn_time = pg.time.get_ticks()  # 出現した時刻を記録
+        self.life = 500  # 残りフレーム数（50FPSで10秒）
 
     def update(self):
         """
-        アイテムが10秒経過したら消える
+        アイテムが10秒（500フレーム）経過したら消える
         """
-        if pg.time.get_ticks() - self.spawn_time > 10000:  # 10秒経過で消える
+        self.life -= 1
+        if self.life < 0:  # 10秒経過で消える
             self.kill()
 
 def game_over(screen): #ゲームオーバー時の画面
     bo =pg.Surface((WIDTH, HEIGHT))
     pg.draw.rect(bo, (0,0,0), pg.Rect(0,0,WIDTH,HEIGHT))
     bo.set_alpha(155)
-    kk_img = pg.transform.rotozoom(pg.image.load("fig/8.png"), 0, 0.9)
+    hint = TEXT.render("ENTER: RETRY   ESC: TITLE", 40, (255, 255, 255))
+    kk_img = ASSETS.image("fig/8.png", 0.9)
     kk_rct = kk_img.get_rect()
     kk_rct.center = 350, 350
-    kk2_img = pg.transform.rotozoom(pg.image.load("fig/8.png"), 0, 0.9)
+    kk2_img = ASSETS.image("fig/8.png", 0.9)
     kk2_rct = kk2_img.get_rect()
     kk2_rct.center = 780, 350
-    fonto = pg.font.Font(None, 80)
-    txt = fonto.render("GAME OVER", True, (255, 255, 255))
+    txt = TEXT.render("GAME OVER", 80, (255, 255, 255))
     screen.blit(bo, [0, 0])
     screen.blit(txt, [400, HEIGHT/2])
     screen.blit(kk_img,kk_rct)
     screen.blit(kk2_img,kk2_rct)
-    pg.display.update()
-    time.sleep(5)
+    screen.blit(hint, hint.get_rect(center=(WIDTH//2, HEIGHT-80)))
 
 
-def main():
+class Lifecycle:
+    """
+    スプライトグループを監視し，despawn_marginを持つスプライトが
+    画面外にその距離以上出たら自動でkillするクラス
+    """
+    def __init__(self, groups: dict[str, pg.sprite.AbstractGroup], culled: tuple[str, ...]):
+        """
+        引数1 groups：グループ名 → 監視するスプライトグループ の辞書
+        引数2 culled：画面外判定を行うグループ名（自分で画面外判定する弾などは含めない）
+        """
+        self.groups = groups
+        self.culled = culled
+        self.despawned = {name: 0 for name in culled}  # グループごとの画面外消去数
+        self.areas: dict[int, pg.Rect] = {}  # 余白 → 余白込みの画面Rect
 
-    pg.display.set_caption("真！こうかとん無双")
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
-    bg_img = pg.image.load(f"fig/pg_bg.jpg")
-    clock  = pg.time.Clock()
-    tmr=0
-    bg_tmr=0
-    score = Score()
-    bird = Bird(3, (300, 200))
-    bird_2p = Bird_2p(10, (300, 400))
-    bombs = pg.sprite.Group()
-    beams = pg.sprite.Group()
-    exps = pg.sprite.Group()
-    emys = pg.sprite.Group()
-    boss = pg.sprite.Group()
-    boss_beams = pg.sprite.Group()
-    b_emys = pg.sprite.Group()
-    sp_emys = pg.sprite.Group()
-    items = pg.sprite.Group()  # アイテム用のグループ
-    enemy_count = 0  # 敵を倒した数をカウント
+    def _area(self, margin: int) -> pg.Rect:
+        """
+        画面Rectを余白分だけ広げたRectを返す
+        引数 margin：余白
+        """
+        area = self.areas.get(margin)
+        if area is None:
+            area = self.areas[margin] = pg.Rect(0, 0, WIDTH, HEIGHT).inflate(2*margin, 2*margin)
+        return area
 
-        
-    
+    def cull(self) -> int:
+        """
+        画面外に出たスプライトをkillする
+        戻り値：このフレームで消したスプライト数
+        """
+        removed = 0
+        for name in self.culled:
+            for sprite in self.groups[name].sprites():
+                margin = getattr(sprite, "despawn_margin", None)
+                if margin is not None and not self._area(margin).colliderect(sprite.rect):
+                    sprite.kill()
+                    self.despawned[name] += 1
+                    removed += 1
+        return removed
+
+    def live_counts(self) -> dict[str, int]:
+        """
+        グループごとの生存スプライト数を返す
+        """
+        return {name: len(group) for name, group in self.groups.items()}
 
 
+class WaveScheduler:
+    """
+    ステージファイル（JSON）に書かれた出現イベントを，出現フレームの優先度付きキューで管理するクラス
+    毎フレーム先頭の出現フレームだけを見るので，イベントが増えても判定の回数は増えない
+
+    ステージファイルの形式：
+        {"events": [{"tick": 200, "type": "Enemy", "every": 200},
+                    {"tick": 300, "type": "Bomb_Enemy", "every": 300, "until": 1700, "y": 200},
+                    {"tick": 200, "type": "Super_Enemy", "every": 200, "params": {"hp": 3}},
+                    {"tick": 2000, "type": "Boss"}]}
+    tick：最初の出現フレーム，every：繰り返し間隔（省略時は1回だけ），
+    until：このフレーム未満まで繰り返す（省略時は無限），x, y：出現位置の中心座標（省略時は各クラスの既定），
+    params：出現後に上書きする属性（体力hpやビーム間隔beam_intervalなど）
+    同じフレームのイベントはファイルに書いた順に出現する
+    """
+    types = {  # イベントの種類 → 追加先のグループ名
+        "Enemy": "emys",
+        "Bomb_Enemy": "b_emys",
+        "Super_Enemy": "sp_emys",
+        "Boss": "boss",
+    }
 
-    while True:
-        #screen.blit(bg_img,[0,0])
+    def __init__(self, events: list[dict]):
+        """
+        引数 events：出現イベントの辞書のリスト
+        """
+        for i, ev in enumerate(events):
+            if ev.get("type") not in self.types:
+                raise ValueError(f"events[{i}]: 不明な種類 {ev.get('type')!r}（{', '.join(self.types)} のいずれか）")
+            if not isinstance(ev.get("tick"), int) or ev["tick"] < 0:
+                raise ValueError(f"events[{i}]: tickは0以上の整数")
+            if "every" in ev and (not isinstance(ev["every"], int) or ev["every"] <= 0):
+                raise ValueError(f"events[{i}]: everyは1以上の整数")
+        self.events = events
+        self.queue = [(ev["tick"], i) for i, ev in enumerate(events)]  # （出現フレーム，イベント番号）
+        heapq.heapify(self.queue)
+
+    @classmethod
+    def load(cls, path: str) -> "WaveScheduler":
+        """
+        ステージファイルを読み込む
+        引数 path：JSONファイルのパス
+        """
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["events"])
 
-        key_lst = pg.key.get_pressed()
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                return 0
-            if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
-                bird.start_charging()  # スペースキーを押したらチャージ開始
-            if event.type == pg.KEYUP and event.key == pg.K_SPACE:
-                if bird.stop_charging():  # チャージが一定時間以上ならチャージショット発射
-                    beams.add(Beam(bird, is_charge_shot=True))
-            if event.type == pg.KEYDOWN and event.key == pg.K_LSHIFT:
-                bird_2p.start_charging()  # 左シフトキーを押したらチャージ開始
-            if event.type == pg.KEYUP and event.key == pg.K_LSHIFT:
-                if bird_2p.stop_charging():  # チャージが一定時間以上ならチャージショット発射
-                    beams.add(Beam(bird_2p, is_charge_shot=True))
-        if bird.state=="alive":
-            if bird.is_charging:
-                bird.charge_time += 1
-            else:
-                if tmr%50==0:
-                    beams.add(Beam(bird))
+    def due(self, tmr: int):
+        """
+        このフレームに出現するイベントを順に返し，繰り返すイベントは次の出現フレームで入れ直す
+        引数 tmr：現在のフレーム
+        """
+        queue = self.queue
+        while queue and queue[0][0] <= tmr:
+            tick, i = heapq.heappop(queue)
+            ev = self.events[i]
+            every = ev.get("every")
+            if every is not None and tick+every < ev.get("until", math.inf):
+                heapq.heappush(queue, (tick+every, i))
+            if tick == tmr:  # 途中から始めた場合など，過ぎたイベントは出現させない
+                yield ev
+
+
+class SpatialGrid:
+    """
+    画面を一定サイズのセルに分割し，スプライトを所属セルに振り分けて
+    近くにあるスプライトだけを衝突判定の候補にするクラス
+    セルへの振り分けはPythonのループなので，判定する両側がmin_size個以上あるときだけ，
+    多い方を（そのフレームで必要になったときに）振り分ける．それより少なければ
+    Rect.collidelistallで全件を調べる方が速い
+    判定結果（順番，dokillでの奪い合い）はpg.sprite.spritecollide・groupcollideと同じ
+    """
+    def __init__(self, cell: int = 110, width: int = WIDTH, height: int = HEIGHT, collided=None,
+                 min_size: int = 64):
+        """
+        引数1 cell：セル1辺の大きさ
+        引数2 width：登録範囲の幅
+        引数3 height：登録範囲の高さ
+        引数4 collided：Rectが重なった組み合わせをさらに絞り込む判定関数（precise_hitなど，Noneなら絞り込まない）
+        引数5 min_size：セルに振り分けるのに必要な，判定する両側それぞれの最小スプライト数
+        """
+        self.cell = cell
+        self.collided = collided
+        self.min_size = min_size
+        self.cols = -(-width//cell)  # 切り上げ
+        self.rows = -(-height//cell)
+        self.groups: dict[str, pg.sprite.AbstractGroup] = {}  # 名前 → 登録したグループ
+        self.lists: dict[str, tuple[list, list[pg.Rect]]] = {}  # 名前 → （スプライト，Rect）のリスト
+        self.cells: dict[str, dict[int, list[int]]] = {}  # 名前 → セル番号 → スプライトの番号
+
+    def clear(self):
+        """
+        登録内容をすべて消す（フレームの始めに呼ぶ）
+        """
+        self.groups.clear()
+        self.lists.clear()
+        self.cells.clear()
 
-        if bird_2p.state=="alive":
-            if bird_2p.is_charging:
-                bird_2p.charge_time += 1
+    def _cell_ids(self, rect: pg.Rect) -> list[int]:
+        """
+        Rectが重なるセル番号のリストを返す（画面外の部分は端のセルに寄せる）
+        引数 rect：調べるRect
+        """
+        c = self.cell
+        x0 = min(max(rect.left//c, 0), self.cols-1)
+        x1 = min(max((rect.right-1)//c, 0), self.cols-1)
+        y0 = min(max(rect.top//c, 0), self.rows-1)
+        y1 = min(max((rect.bottom-1)//c, 0), self.rows-1)
+        return [y*self.cols+x for y in range(y0, y1+1) for x in range(x0, x1+1)]
+
+    def _bucket(self, rects: list[pg.Rect]) -> dict[int, list[int]]:
+        """
+        Rectを所属セルに振り分ける
+        引数 rects：振り分けるRectのリスト
+        戻り値：セル番号 → rectsの番号のリスト の辞書
+        """
+        cells: dict[int, list[int]] = {}
+        for i, rect in enumerate(rects):
+            for c in self._cell_ids(rect):
+                cells.setdefault(c, []).append(i)
+        return cells
+
+    def _near(self, cells: dict[int, list[int]], rects: list[pg.Rect], rect: pg.Rect) -> list[int]:
+        """
+        セルに振り分けたRectのうち，rectと重なるものの番号を振り分け前の順に返す
+        """
+        idx = {i for c in self._cell_ids(rect) for i in cells.get(c, ())}
+        return sorted(i for i in idx if rect.colliderect(rects[i]))
+
+    def register(self, name: str, group: pg.sprite.AbstractGroup):
+        """
+        グループを問い合わせ用の名前で登録する（セルへの振り分けは必要になるまで行わない）
+        引数1 name：問い合わせに使うグループ名
+        引数2 group：登録するスプライトグループ
+        """
+        self.groups[name] = group
+        self.lists.pop(name, None)
+        self.cells.pop(name, None)
+
+    def _listing(self, name: str) -> tuple[list, list[pg.Rect]]:
+        """
+        登録したグループのスプライトとRectのリストを返す（フレームで最初に呼ばれたときに作る）
+        """
+        listing = self.lists.get(name)
+        if listing is None:
+            sprites = self.groups[name].sprites()
+            listing = self.lists[name] = (sprites, [sprite.rect for sprite in sprites])
+        return listing
+
+    def query(self, name: str, rect: pg.Rect) -> list[pg.sprite.Sprite]:
+        """
+        登録済みグループのうち，rectと重なるスプライトのリストを返す
+        引数1 name：登録時のグループ名
+        引数2 rect：判定するRect
+        戻り値：重なっている（まだグループに残っている）スプライトのグループ順のリスト
+        """
+        group = self.groups[name]
+        sprites, rects = self._listing(name)
+        cells = self.cells.get(name)
+        idx = rect.collidelistall(rects) if cells is None else self._near(cells, rects, rect)
+        return [sprites[i] for i in idx if group.has_internal(sprites[i])]
+
+    def _finish(self, sprite: pg.sprite.Sprite, hits: list[pg.sprite.Sprite], dokill: bool) -> list[pg.sprite.Sprite]:
+        """
+        Rectが重なった相手をcollidedで絞り込み，必要ならkillする
+        """
+        if self.collided is not None:
+            hits = [hit for hit in hits if self.collided(sprite, hit)]
+        if dokill:
+            for hit in hits:
+                hit.kill()
+        return hits
+
+    def spritecollide(self, sprite: pg.sprite.Sprite, name: str, dokill: bool) -> list[pg.sprite.Sprite]:
+        """
+        pg.sprite.spritecollideと同じ結果を求める
+        引数1 sprite：判定するスプライト
+        引数2 name：相手グループの登録名
+        引数3 dokill：衝突した相手をkillするかどうか
+        """
+        return self._finish(sprite, self.query(name, sprite.rect), dokill)
+
+    def groupcollide(self, group: pg.sprite.AbstractGroup, name: str,
+                     dokilla: bool, dokillb: bool) -> dict[pg.sprite.Sprite, list[pg.sprite.Sprite]]:
+        """
+        pg.sprite.groupcollideと同じ結果を求める（両側がmin_size個以上なら多い方をセルに振り分ける）
+        引数1 group：判定するグループ
+        引数2 name：相手グループの登録名
+        引数3 dokilla：衝突したgroup側のスプライトをkillするかどうか
+        引数4 dokillb：衝突した相手側のスプライトをkillするかどうか
+        戻り値：group側のスプライト → 衝突した相手スプライトのリスト の辞書
+        """
+        sprites = group.sprites()
+        targets, rects = self._listing(name)
+        near = None  # group側の番号 → 重なる相手の番号（group側を振り分けたときだけ使う）
+        if min(len(sprites), len(targets)) >= self.min_size:
+            if len(targets) >= len(sprites):
+                if name not in self.cells:
+                    self.cells[name] = self._bucket(rects)
+            else:
+                own = [sprite.rect for sprite in sprites]
+                cells = self._bucket(own)
+                near = {}
+                for j, rect in enumerate(rects):  # 相手の順に調べるので，各リストは相手のグループ順になる
+                    for i in self._near(cells, own, rect):
+                        near.setdefault(i, []).append(j)
+        target_group = self.groups[name]
+        crashed = {}
+        for i, sprite in enumerate(sprites):
+            if near is None:
+                hits = self.query(name, sprite.rect)
             else:
-                if tmr%50==0:
-                    beams.add(Beam(bird_2p))
+                hits = [targets[j] for j in near.get(i, ()) if target_group.has_internal(targets[j])]
+            hits = self._finish(sprite, hits, dokillb)
+            if hits:
+                crashed[sprite] = hits
+                if dokilla:
+                    sprite.kill()
+        return crashed
 
 
-        x = -(bg_tmr%3200)
-        screen.blit(bg_img, [x, 0])
-        screen.blit(pg.transform.flip(bg_img,True,False), [x+1600, 0])
-        screen.blit(bg_img, [x+3200, 0])
-        screen.blit(pg.transform.flip(bg_img,True,False), [x+4800, 0])
+class ProjectileHit:
+    """
+    ProjectileFieldの衝突判定で当たった弾の位置（Rect），ダメージ，画像とマスク
+    """
+    __slots__ = ("rect", "damage", "image", "mask")
 
-        if 100<tmr :
-            if tmr%200 == 0:  # 200フレームに1回，敵機を出現させる
-                emys.add(Enemy())
+    def __init__(self, rect: pg.Rect, damage: int, image: pg.Surface, mask: pg.mask.Mask):
+        self.rect = rect
+        self.damage = damage
+        self.image = image
+        self.mask = mask
 
-            if tmr%200 == 0:
-                sp_emys.add(Super_Enemy(3))
 
-            if tmr < 1700:
-                if tmr%300 == 0:
-                    b_emys.add(Bomb_Enemy())
+class ProjectileField:
+    """
+    ビーム・爆弾・ボスビームの位置，速度，ダメージ，大きさをNumPy配列で持ち，
+    移動・画面外判定・衝突判定をフレームごとに配列演算1回で行うクラス
+    位置と大きさはRectと同じく整数の左上座標と幅・高さで持ち，1フレームの移動量も
+    Rect.move_ipと同じく0の方向に切り捨てた整数にするので，スプライト版と同じ展開になる
+    """
+    kinds = {"beams": 0, "bombs": 1, "boss_beams": 2}  # 弾の種類名 → 種類番号
 
-        if tmr/2000 == 1:
-            boss.add(Boss(boss_beams))
+    def __init__(self, capacity: int = 1024, collided=None):
+        """
+        引数1 capacity：最初に確保する弾の数（足りなくなれば倍に広げる）
+        引数2 collided：Rectが重なった組み合わせをさらに絞り込む判定関数（precise_hitなど，Noneなら絞り込まない）
+        """
+        if load_numpy() is None:
+            raise ImportError("ProjectileFieldにはNumPyが必要です")
+        self.n = 0  # 生存中の弾の数（配列の先頭n個が有効）
+        self.pos = np.zeros((capacity, 2), np.int64)  # 左上座標
+        self.prev = np.zeros((capacity, 2), np.int64)  # 前フレームの左上座標（補間描画用）
+        self.vel = np.zeros((capacity, 2), np.int64)  # 1フレームあたりの移動量
+        self.size = np.zeros((capacity, 2), np.int64)  # 幅と高さ
+        self.damage = np.zeros(capacity, np.int32)
+        self.kind = np.zeros(capacity, np.int8)
+        self.img = np.zeros(capacity, np.int32)  # imagesの番号
+        self.images: list[pg.Surface] = []  # 見た目ごとのSurface
+        self.masks: list[pg.mask.Mask] = []  # 見た目ごとのマスク（imagesと同じ番号）
+        self.image_ids: dict = {}  # 見た目のキー → imagesの番号
+        self.collided = collided
+
+    def _grow(self):
+        """
+        配列の容量を倍にする
+        """
+        for name in ("pos", "prev", "vel", "size", "damage", "kind", "img"):
+            arr = getattr(self, name)
+            new = np.zeros((2*len(arr),) + arr.shape[1:], arr.dtype)
+            new[:self.n] = arr[:self.n]
+            setattr(self, name, new)
 
-        for b_emy in b_emys:
-            target=random.choice([bird,bird_2p])
-            if bird.state=="dead":
-                target=bird_2p
-            if bird_2p.state=="dead":
-                target=bird
-            if b_emy.state == "stop" and tmr%b_emy.interval == 0:
-                # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
-                bombs.add(Bomb(b_emy, target))
+    def add(self, name: str, sprite: "Beam|Bomb|BossBeam"):
+        """
+        生成済みの弾スプライトの状態を配列に写し，スプライトはプールに戻す
+        引数1 name：弾の種類名（"beams"，"bombs"，"boss_beams"）
+        引数2 sprite：写す弾スプライト
+        """
+        if self.n == len(self.pos):
+            self._grow()
+        img_id = self.image_ids.get(sprite.look)
+        if img_id is None:  # 初めての見た目はコピーして登録（プールの再利用で書き換わるため）
+            img_id = self.image_ids[sprite.look] = len(self.images)
+            self.images.append(sprite.image.copy())
+            self.masks.append(pg.mask.from_surface(self.images[img_id]))
+        i = self.n
+        self.pos[i] = self.prev[i] = sprite.rect.topleft
+        self.vel[i] = [int(v) for v in sprite.velocity()]  # Rect.move_ipと同じく0の方向に切り捨てる
+        self.size[i] = sprite.rect.size
+        self.damage[i] = sprite.damage
+        self.kind[i] = __class__.kinds[name]
+        self.img[i] = img_id
+        self.n += 1
+        sprite.recycle()
+
+    def _keep(self, keep: "np.ndarray"):
+        """
+        keepがTrueの弾だけを配列の先頭に詰め直す
+        引数 keep：生存中の弾ごとの真理値配列
+        """
+        n = int(np.count_nonzero(keep))
+        for name in ("pos", "prev", "vel", "size", "damage", "kind", "img"):
+            arr = getattr(self, name)
+            arr[:n] = arr[:self.n][keep]
+        self.n = n
+
+    def _remove(self, idx: "np.ndarray"):
+        """
+        指定した番号の弾を消す
+        引数 idx：消す弾の番号の配列
+        """
+        keep = np.ones(self.n, bool)
+        keep[idx] = False
+        self._keep(keep)
+
+    def store_prev(self):
+        """
+        現在の位置を補間描画用に保存する
+        """
+        self.prev[:self.n] = self.pos[:self.n]
+
+    def snapshot(self) -> tuple:
+        """
+        生存中の弾の配列を複製して返す（見た目の一覧は追加されるだけなので複製しない）
+        """
+        n = self.n
+        return n, tuple(getattr(self, name)[:n].copy() for name in ("pos", "prev", "vel", "size", "damage", "kind", "img"))
+
+    def restore(self, snap: tuple):
+        """
+        snapshot()の時点の弾に戻す
+        引数 snap：snapshot()の戻り値
+        """
+        n, arrays = snap
+        while len(self.pos) < n:
+            self._grow()
+        for name, arr in zip(("pos", "prev", "vel", "size", "damage", "kind", "img"), arrays):
+            getattr(self, name)[:n] = arr
+        self.n = n
+
+    def _draw_pos(self, alpha: float | None) -> "np.ndarray":
+        """
+        描画する左上座標を返す
+        引数 alpha：前フレームから現フレームへの補間率（Noneなら現在位置）
+        """
+        n = self.n
+        if alpha is None:
+            return self.pos[:n]
+        return np.rint(self.prev[:n] + (self.pos[:n]-self.prev[:n])*alpha).astype(np.int64)
+
+    def update(self):
+        """
+        全弾を移動させ，画面からはみ出した弾を消す
+        """
+        n = self.n
+        pos = self.pos[:n]
+        pos += self.vel[:n]
+        lo, hi = pos, pos+self.size[:n]
+        inside = (lo[:, 0] >= 0) & (hi[:, 0] <= WIDTH) & (lo[:, 1] >= 0) & (hi[:, 1] <= HEIGHT)
+        if not inside.all():
+            self._keep(inside)
+
+    def count(self, name: str) -> int:
+        """
+        指定した種類の生存中の弾の数を返す
+        引数 name：弾の種類名
+        """
+        return int(np.count_nonzero(self.kind[:self.n] == __class__.kinds[name]))
+
+    def toplefts(self, name: str) -> list[tuple[int, int]]:
+        """
+        指定した種類の弾の左上座標のリストを返す（追加した順）
+        引数 name：弾の種類名
+        """
+        n = self.n
+        return list(map(tuple, self.pos[:n][self.kind[:n] == __class__.kinds[name]].tolist()))
+
+    def clear(self, name: str):
+        """
+        指定した種類の弾をすべて消す
+        引数 name：弾の種類名
+        """
+        self._keep(self.kind[:self.n] != __class__.kinds[name])
+
+    def _hit_matrix(self, name: str, rects: list[pg.Rect]) -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        指定した種類の弾とRectの重なりを配列演算で求める
+        引数1 name：弾の種類名
+        引数2 rects：判定するRectのリスト
+        戻り値：対象の弾の番号の配列，（弾の数，Rectの数）の重なり真理値配列
+        """
+        idx = np.flatnonzero(self.kind[:self.n] == __class__.kinds[name])
+        boxes = np.array([(r.left, r.top, r.right, r.bottom) for r in rects], np.int64).reshape(-1, 4)
+        lo = self.pos[idx]
+        hi = lo+self.size[idx]
+        hit = ((lo[:, 0, None] < boxes[None, :, 2]) & (hi[:, 0, None] > boxes[None, :, 0]) &
+               (lo[:, 1, None] < boxes[None, :, 3]) & (hi[:, 1, None] > boxes[None, :, 1]))
+        return idx, hit
+
+    def _hit(self, i: int) -> ProjectileHit:
+        """
+        弾の番号から当たった弾の情報を作る
+        """
+        rect = pg.Rect(self.pos[i].tolist(), self.size[i].tolist())
+        j = self.img[i]
+        return ProjectileHit(rect, int(self.damage[i]), self.images[j], self.masks[j])
+
+    def _refine(self, idx: "np.ndarray", hit: "np.ndarray", sprites: list[pg.sprite.Sprite]) -> "np.ndarray":
+        """
+        Rectが重なった組み合わせだけをcollidedで判定し直す
+        引数1 idx：_hit_matrixが返した弾の番号の配列
+        引数2 hit：_hit_matrixが返した重なり真理値配列（書き換える）
+        引数3 sprites：判定したスプライトのリスト（hitの列の順）
+        """
+        if self.collided is not None:
+            for r, j in zip(*np.nonzero(hit)):
+                if not self.collided(sprites[j], self._hit(idx[r])):
+                    hit[r, j] = False
+        return hit
+
+    def spritecollide(self, sprite: pg.sprite.Sprite, name: str, dokill: bool) -> list[ProjectileHit]:
+        """
+        pg.sprite.spritecollideと同じ判定を配列演算で行う
+        引数1 sprite：判定するスプライト
+        引数2 name：弾の種類名
+        引数3 dokill：当たった弾を消すかどうか
+        戻り値：当たった弾のリスト
+        """
+        if self.n == 0:
+            return []
+        idx, hit = self._hit_matrix(name, [sprite.rect])
+        hit = self._refine(idx, hit, [sprite])
+        hit_idx = idx[hit[:, 0]]
+        hits = [self._hit(i) for i in hit_idx]
+        if dokill and hits:
+            self._remove(hit_idx)
+        return hits
+
+    def groupcollide(self, group: pg.sprite.AbstractGroup, name: str,
+                     dokilla: bool, dokillb: bool) -> dict[pg.sprite.Sprite, list[ProjectileHit]]:
+        """
+        pg.sprite.groupcollideと同じ判定を配列演算で行う
+        （dokillbのとき，複数に重なる弾はグループ内で先のスプライトにだけ当たる）
+        引数1 group：判定するグループ
+        引数2 name：弾の種類名
+        引数3 dokilla：当たったgroup側のスプライトをkillするかどうか
+        引数4 dokillb：当たった弾を消すかどうか
+        戻り値：group側のスプライト → 当たった弾のリスト の辞書
+        """
+        sprites = group.sprites()
+        if self.n == 0 or not sprites:
+            return {}
+        idx, hit = self._hit_matrix(name, [s.rect for s in sprites])
+        hit = self._refine(idx, hit, sprites)
+        rows = np.flatnonzero(hit.any(axis=1))
+        if rows.size == 0:
+            return {}
+        crashed: dict[pg.sprite.Sprite, list[ProjectileHit]] = {}
+        if dokillb:
+            for r, j in zip(rows, hit[rows].argmax(axis=1)):
+                crashed.setdefault(sprites[j], []).append(self._hit(idx[r]))
+        else:
+            for j in np.flatnonzero(hit.any(axis=0)):
+                crashed[sprites[j]] = [self._hit(i) for i in idx[hit[:, j]]]
+        crashed = {s: crashed[s] for s in sprites if s in crashed}  # グループの順に並べる
+        if dokillb:
+            self._remove(idx[rows])
+        if dokilla:
+            for sprite in crashed:
+                sprite.kill()
+        return crashed
+
+    def rects(self, alpha: float | None = None) -> list[pg.Rect]:
+        """
+        生存中の全弾の描画Rectのリストを返す
+        引数 alpha：前フレームから現フレームへの補間率（Noneなら現在位置）
+        """
+        n = self.n
+        lo = self._draw_pos(alpha).tolist()
+        size = self.size[:n].tolist()
+        return [pg.Rect(xy, wh) for xy, wh in zip(lo, size)]
+
+    def draw(self, screen: pg.Surface, alpha: float | None = None):
+        """
+        全弾を配列の位置にまとめて転送する
+        引数1 screen：画面Surface
+        引数2 alpha：前フレームから現フレームへの補間率（Noneなら現在位置）
+        """
+        n = self.n
+        if n == 0:
+            return
+        topleft = self._draw_pos(alpha).tolist()
+        images = self.images
+        screen.blits([(images[i], xy) for i, xy in zip(self.img[:n].tolist(), topleft)], False)
+
+
+class ProjectileLane:
+    """
+    ProjectileFieldの1種類の弾をスプライトグループのように扱うための窓口
+    （add，len，emptyに対応し，update，drawはProjectileField側でまとめて行う）
+    """
+    def __init__(self, field: ProjectileField, name: str):
+        """
+        引数1 field：弾を保持するProjectileField
+        引数2 name：弾の種類名
+        """
+        self.field = field
+        self.name = name
+
+    def add(self, *sprites: pg.sprite.Sprite):
+        for sprite in sprites:
+            self.field.add(self.name, sprite)
+
+    def update(self, *args):
+        pass
+
+    def draw(self, screen: pg.Surface, *args):
+        pass
 
-        for emy in pg.sprite.groupcollide(emys, beams, True, True).keys():
-            exps.add(Explosion(emy, 100))  # 爆発エフェクト
-            score.value += 10  # 10点アップ
-            bird.change_img(6, screen)  # こうかとん喜びエフェクト
-            enemy_count += 1  # 敵を倒した数を増やす
+    def empty(self):
+        self.field.clear(self.name)
 
+    def toplefts(self) -> list[tuple[int, int]]:
+        return self.field.toplefts(self.name)
+
+    def __len__(self) -> int:
+        return self.field.count(self.name)
+
+
+class EffectField:
+    """
+    爆発エフェクトを配列でまとめて管理するクラス
+    左上座標と消えるフレームだけを配列に持ち，共有のコマ画像で描画する
+    （残りフレーム数を持つと毎フレーム全要素を減らすループが要るので，経過フレーム数tickとの差で表す）
+    近くに出た爆発は1つにまとめ（残りフレーム数を延ばすだけ），上限数を超えたら古いものから捨てる
+    描画は1フレームの時間予算に収まる数だけ新しい方から行い，残りは描画を省く（ゲームの進行には影響しない）
+    """
+    frame_ticks = 10  # 1コマを表示するフレーム数
+
+    def __init__(self, capacity: int = 64, merge_dist: int = 20, budget: float = EFFECTS_BUDGET):
+        """
+        引数1 capacity：同時に出しておく最大数
+        引数2 merge_dist：中心がこの距離（x，yとも）以内の爆発は1つにまとめる
+        引数3 budget：1フレームの描画に使ってよい時間（ミリ秒，正の値）
+        """
+        if budget <= 0:
+            raise ValueError(f"描画の時間予算は正の値にしてください：{budget}")
+        self.capacity = capacity
+        self.merge_dist = merge_dist
+        self.budget = budget/1000
+        self.x = array.array("i")  # 左上のx座標
+        self.y = array.array("i")  # 左上のy座標
+        self.end = array.array("i")  # 消えるフレーム（tickがこれを超えたら消える）
+        self.tick = 0  # update()を呼んだ回数
+        self.frames: tuple[pg.Surface, pg.Surface] | None = None  # 全エフェクトで共有するコマ画像（最初の爆発で引く）
+        self.cost = 0.0  # 1つあたりの描画時間（秒）の移動平均
+        self.merged = 0  # まとめた数
+        self.dropped = 0  # 上限を超えて捨てた数
+        self.skipped = 0  # 時間予算を超えて描画を省いた延べ数
+
+    def spawn(self, center: tuple[int, int], life: int):
+        """
+        爆発エフェクトを出す
+        引数1 center：爆発の中心座標
+        引数2 life：爆発時間
+        """
+        if self.frames is None:  # Gameは画面形式への変換の後に作るので，1回引けば変換済みの画像になる
+            self.frames = (
+                ASSETS.image("fig/explosion.gif"),
+                ASSETS.image("fig/explosion.gif", flip=(True, True)),
+            )
+        w, h = self.frames[0].get_size()
+        x, y = center[0]-w//2, center[1]-h//2
+        d = self.merge_dist
+        end = self.tick+life
+        for i in range(len(self.end)):
+            if abs(self.x[i]-x) <= d and abs(self.y[i]-y) <= d:
+                self.end[i] = max(self.end[i], end)
+                self.merged += 1
+                return
+        if len(self.end) >= self.capacity:
+            for arr in (self.x, self.y, self.end):
+                del arr[0]
+            self.dropped += 1
+        self.x.append(x)
+        self.y.append(y)
+        self.end.append(end)
+
+    def update(self):
+        """
+        1フレーム進め，終わったエフェクトを取り除く（終わったものがなければ配列には触れない）
+        """
+        self.tick += 1
+        tick = self.tick
+        if self.end and min(self.end) < tick:
+            keep = [i for i, end in enumerate(self.end) if end >= tick]
+            self.x = array.array("i", (self.x[i] for i in keep))
+            self.y = array.array("i", (self.y[i] for i in keep))
+            self.end = array.array("i", (self.end[i] for i in keep))
+
+    def draw(self, screen: pg.Surface, *args):
+        """
+        時間予算に収まる数だけ，新しいエフェクトから描画する
+        （予算が足りなくても最新の1つは描き，1つあたりの描画時間を測り直し続ける）
+        引数 screen：画面Surface
+        """
+        n = len(self.end)
+        if n == 0:
+            return
+        first = min(max(0, n-int(self.budget/self.cost)), n-1) if self.cost > 0 else 0
+        frames, ticks, tick = self.frames, __class__.frame_ticks, self.tick
+        start = time.perf_counter()
+        screen.blits([(frames[(end-tick)//ticks%2], (x, y))
+                      for x, y, end in zip(self.x[first:], self.y[first:], self.end[first:])], False)
+        self.cost = 0.9*self.cost + 0.1*(time.perf_counter()-start)/(n-first)
+        self.skipped += first
+
+    def rects(self) -> list[pg.Rect]:
+        """
+        戻り値：全エフェクトの描画領域のRectのリスト
+        """
+        if self.frames is None:
+            return []
+        w, h = self.frames[0].get_size()
+        return [pg.Rect(x, y, w, h) for x, y in zip(self.x, self.y)]
+
+    def toplefts(self) -> list[tuple[int, int]]:
+        """
+        戻り値：全エフェクトの左上座標のリスト（古い順）
+        """
+        return list(zip(self.x, self.y))
+
+    def empty(self):
+        for arr in (self.x, self.y, self.end):
+            del arr[:]
+
+    def snapshot(self) -> tuple:
+        """
+        経過フレーム数と，座標と消えるフレームの配列の複製を返す
+        """
+        return self.tick, array.array("i", self.x), array.array("i", self.y), array.array("i", self.end)
+
+    def restore(self, snap: tuple):
+        """
+        snapshot()の時点のエフェクトに戻す
+        引数 snap：snapshot()の戻り値
+        """
+        self.tick = snap[0]
+        self.x, self.y, self.end = (array.array("i", arr) for arr in snap[1:])
+
+    def stats(self) -> dict[str, int]:
+        """
+        戻り値：生存数，まとめた数，捨てた数，描画を省いた延べ数の辞書
+        """
+        return {"live": len(self.end), "merged": self.merged, "dropped": self.dropped, "skipped": self.skipped}
+
+    def __len__(self) -> int:
+        return len(self.end)
+
+
+class Profiler:
+    """
+    フレーム内の各処理にかかった時間を計測し，移動平均・p99の表示やファイルへの保存を行うクラス
+    処理の区切りごとにlap()を呼ぶと，前の区切りからの時間がその処理名に加算される
+    """
+    def __init__(self, enabled: bool = True, window: int = 250, keep_records: bool = False):
+        """
+        引数1 enabled：Falseならlap()などは何もしない
+        引数2 window：移動平均とp99に使う直近のフレーム数
+        引数3 keep_records：Trueなら保存用に全フレームの記録を残す
+        """
+        self.enabled = enabled
+        self.keep_records = keep_records
+        self.visible = False  # オーバーレイを表示するかどうか
+        self.window = window
+        self.recent: collections.deque[dict[str, float]] = collections.deque(maxlen=window)
+        self.records: list[dict[str, float]] = []  # 保存用の全フレームの記録（ミリ秒）
+        self.current: dict[str, float] = {}  # 計測中のフレームの処理名 → 秒
+        self.last = 0.0  # 直前の区切りの時刻
+        self.frame_start = None  # 計測中のフレームの開始時刻
+        self.font = None
+
+    def begin_frame(self):
+        """
+        フレームの計測を始める
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.current["frame"] = now-self.frame_start  # 前フレームの開始からの実時間
+        self.frame_start = self.last = now
+
+    def lap(self, name: str):
+        """
+        前の区切りからの経過時間を処理nameの時間として加算する
+        引数 name：処理名
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0.0) + now-self.last
+        self.last = now
+
+    def skip(self):
+        """
+        前の区切りからの時間をどの処理にも加算せずに捨てる
+        """
+        if self.enabled:
+            self.last = time.perf_counter()
+
+    def end_frame(self, counts: dict[str, int] | None = None):
+        """
+        計測中のフレームの記録を確定する
+        引数 counts：グループ名 → スプライト数（記録に含める）
+        """
+        if not self.enabled:
+            return
+        frame = self.current.pop("frame", None)
+        record = {name: sec*1000 for name, sec in self.current.items()}
+        record["work"] = sum(record.values())  # 計測した処理の合計
+        if frame is not None:
+            record["frame"] = frame*1000
+        for name, n in (counts or {}).items():
+            record[f"n.{name}"] = n
+        self.recent.append(record)
+        if self.keep_records:
+            self.records.append(record)
+        self.current = {}
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        直近windowフレームの処理ごとの平均とp99（ミリ秒）を返す
+        """
+        values: dict[str, list[float]] = {}
+        for record in self.recent:
+            for name, v in record.items():
+                values.setdefault(name, []).append(v)
+        result = {}
+        for name, vs in values.items():
+            vs.sort()
+            result[name] = {"mean": sum(vs)/len(vs), "p99": vs[min(len(vs)-1, int(len(vs)*0.99))]}
+        return result
+
+    def draw_overlay(self, screen: pg.Surface) -> pg.Rect | None:
+        """
+        処理時間の移動平均・p99とスプライト数を画面左上に表示する
+        引数 screen：画面Surface
+        戻り値：表示した領域（表示しなければNone）
+        """
+        if not (self.enabled and self.visible):
+            return None
+        if self.font is None:
+            self.font = TEXT.font(22)
+        summary = self.summary()
+        times = sorted(((k, v) for k, v in summary.items() if not k.startswith("n.")),
+                       key=lambda kv: -kv[1]["mean"])
+        lines = [f"{name:<18} {v['mean']:6.2f} ms  p99 {v['p99']:6.2f} ms" for name, v in times[:16]]
+        counts = [f"{k[2:]}={int(v['mean'])}" for k, v in summary.items() if k.startswith("n.")]
+        lines.append(" ".join(counts))
+        texts = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        box = pg.Surface((max(t.get_width() for t in texts)+12, 18*len(texts)+8))
+        box.set_alpha(170)
+        screen.blit(box, (0, 0))
+        for i, text in enumerate(texts):
+            screen.blit(text, (6, 4+18*i))
+        return box.get_rect()
+
+    def dump(self, path: str):
+        """
+        全フレームの記録をファイルに保存する（拡張子が.jsonならJSON，それ以外はCSV）
+        引数 path：保存先のパス
+        """
+        names = sorted({name for record in self.records for name in record})
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "frames": self.records}, f)
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, ["index"]+names)
+            writer.writeheader()
+            for i, record in enumerate(self.records):
+                writer.writerow({"index": i, **record})
+
+
+class GameState:
+    """
+    Game.snapshot()で取り出した，ある時点のゲームの状態
+    タイマー・スコアなどの値，乱数の状態，出現予定，こうかとんと全グループのスプライト（SpriteStates），
+    爆発（EffectField）と配列版の弾（ProjectileField）の配列の写しを持つ
+    スプライトはdeepcopyせずに参照したまま，Rectを配列に，その他の属性を値のタプルに写すだけなので，
+    1000スプライトでも1ミリ秒かからない（benchmark.py --snapshots）
+    """
+    __slots__ = ("tmr", "state", "score", "enemy_count", "rng", "waves", "despawned",
+                 "birds", "groups", "exps", "projectiles")
+
+    def sprite_count(self) -> int:
+        """
+        保存しているスプライト数（こうかとんと配列版の弾を含む）を返す
+        """
+        count = len(self.birds)+sum(len(sprites) for _, sprites in self.groups)
+        if self.projectiles is not None:
+            count += self.projectiles[0]
+        return count
+
+
+class Game:
+    """
+    ゲームの状態（タイマー，スプライトグループ，こうかとん，スコア）を保持し，
+    描画とは切り離して1フレームずつ進めるクラス
+    """
+    def __init__(self, vector: bool = False, profiler: Profiler | None = None, seed: int | None = None,
+                 level: str = LEVEL, players: int = 2, precise: bool = False,
+                 effects_budget: float = EFFECTS_BUDGET, pools: dict[type, Pool] | None = None):
+        """
+        引数1 vector：Trueなら弾（ビーム・爆弾・ボスビーム）をProjectileFieldでまとめて処理する
+        引数2 profiler：処理時間を計測するProfiler（Noneなら計測しない）
+        引数3 seed：ゲーム内の乱数のシード（同じシードと入力なら同じ展開になる）
+        引数4 level：敵の出現スケジュールを書いたステージファイルのパス
+        引数5 players：こうかとんの数（1～MAX_PLAYERS）
+        引数6 precise：Trueなら，Rectが重なった後に画像の不透明部分どうしの重なりも判定する
+        引数7 effects_budget：爆発エフェクトの描画に1フレームで使ってよい時間（ミリ秒）
+        引数8 pools：短命なスプライトのプール（Noneなら新しく作る．前のラウンドのものは使い回してよいが，
+                    同時に進めるGameどうしでは共有しない）
+        """
+        self.tmr = 0
+        self.seed = seed
+        self.vector = vector
+        self.rng = random.Random(seed)  # ゲーム専用の乱数生成器
+        self.pools = pools if pools is not None else new_pools()  # ゲーム専用のプール
+        self.prof = profiler or Profiler(enabled=False)
+        self.score = Score()
+        self.birds = [Bird(num, xy) for num, xy in PLAYERS[:players]]
+        collided = precise_hit if precise else None  # Rectの重なりの後に行う精密な判定
+        self.projectiles = ProjectileField(collided=collided) if vector else None
+        if self.projectiles is not None:
+            self.bombs = ProjectileLane(self.projectiles, "bombs")
+            self.beams = ProjectileLane(self.projectiles, "beams")
+            self.boss_beams = ProjectileLane(self.projectiles, "boss_beams")
+        else:
+            self.bombs = pg.sprite.Group()
+            self.beams = pg.sprite.Group()
+            self.boss_beams = pg.sprite.Group()
+        self.exps = EffectField(budget=effects_budget)
+        self.emys = pg.sprite.Group()
+        self.boss = pg.sprite.Group()
+        self.b_emys = pg.sprite.Group()
+        self.sp_emys = pg.sprite.Group()
+        self.items = pg.sprite.Group()  # アイテム用のグループ
+        self.enemy_count = 0  # 敵を倒した数をカウント
+        self.state = "playing"  # 進行中："playing"／ゲームオーバー："over"／クリア："clear"
+        self.invincible = False  # Trueならこうかとんがやられない（ベンチマーク用）
+        self.grid = SpatialGrid(collided=collided)  # 衝突判定用の空間グリッド
+        self.groups = {  # グループ名 → スプライトグループ
+            "beams": self.beams,
+            "emys": self.emys,
+            "b_emys": self.b_emys,
+            "sp_emys": self.sp_emys,
+            "bombs": self.bombs,
+            "exps": self.exps,
+            "boss": self.boss,
+            "boss_beams": self.boss_beams,
+            "items": self.items,
+        }
+        self.lifecycle = Lifecycle(self.groups, ("emys", "b_emys", "sp_emys", "boss"))
+        self.waves = WaveScheduler.load(level)
+
+    def step(self, inputs: tuple[int, ...]):
+        """
+        こうかとんごとの入力ビットをもとにゲームを1フレーム進める
+        引数 inputs：こうかとんの順に並べた入力ビット
+        戻り値：進行状態（"playing"，"over"，"clear"）
+        """
+        birds = self.birds
+        tmr = self.tmr
+        prof = self.prof
+        prof.skip()
+        self.store_prev()
+        prof.lap("store_prev")
+        for b, inp in zip(birds, inputs):
+            if b.state != "alive":
+                continue
+            # チャージキーを押したらチャージ開始，離したら一定時間以上でチャージショット発射
+            if inp & IN_CHARGE and not b.is_charging:
+                b.start_charging()
+            elif not inp & IN_CHARGE and b.is_charging:
+                if b.stop_charging():
+                    self.beams.add(Beam.spawn(self.pools, b, is_charge_shot=True))
+            if b.is_charging:
+                b.charge_time += 1
+            elif tmr%50 == 0:
+                self.beams.add(Beam.spawn(self.pools, b))
+
+        for ev in self.waves.due(tmr):  # ステージファイルで出現フレームになった敵を出す
+            self.spawn(ev)
+
+        for b_emy in self.b_emys:
+            target=self.rng.choice(birds)
+            if target.state=="dead":  # 行動不能のこうかとんは狙わない
+                target=next((b for b in birds if b.state=="alive"), target)
+            if b_emy.state == "stop" and tmr%b_emy.interval == 0:
+                # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
+                self.bombs.add(Bomb.spawn(self.pools, b_emy, target, self.rng))
+        prof.lap("spawn")
+
+        self.collide()
+        if self.state != "playing":
+            return self.state
+
+        for b, inp in zip(birds, inputs):
+            b.update(inp)
+        prof.lap("update.birds")
+        for name in ("beams", "emys", "b_emys", "sp_emys", "bombs", "exps"):
+            self.groups[name].update()
+            prof.lap(f"update.{name}")
+        self.boss.update(tmr)
+        prof.lap("update.boss")
+        self.boss_beams.update()
+        prof.lap("update.boss_beams")
+        if self.projectiles is not None:
+            self.projectiles.update()  # 配列版の弾はここでまとめて移動
+            prof.lap("update.projectiles")
+        self.items.update()  # アイテムの更新（時間経過チェック）
+        prof.lap("update.items")
+        self.lifecycle.cull()  # 画面外に出た敵機を消す
+        prof.lap("cull")
+        self.tmr += 1
+        return self.state
+
+    def spawn(self, ev: dict):
+        """
+        ステージファイルの出現イベントに従って敵を出現させる
+        引数 ev：出現イベントの辞書（WaveScheduler参照）
+        """
+        kind = ev["type"]
+        if kind == "Enemy":
+            emy = Enemy(self.rng)
+        elif kind == "Bomb_Enemy":
+            emy = Bomb_Enemy(self.rng)
+        elif kind == "Super_Enemy":
+            emy = Super_Enemy(3, self.rng)
+        else:
+            emy = Boss(self.boss_beams, self.pools)
+        if "x" in ev:
+            emy.rect.centerx = ev["x"]
+        if "y" in ev:
+            emy.rect.centery = ev["y"]
+        for name, value in ev.get("params", {}).items():
+            if not hasattr(emy, name):
+                raise ValueError(f"{kind}に属性 {name!r} はありません")
+            setattr(emy, name, value)
+        self.groups[WaveScheduler.types[kind]].add(emy)
+
+    def collide(self):
+        """
+        ビームと敵機，こうかとんと敵機・爆弾・アイテムの衝突を処理し，
+        スコアと進行状態を更新する
+        """
+        birds = self.birds
+        prof = self.prof
+        grid = self.grid
+        grid.clear()
+        for name in ("emys", "b_emys", "sp_emys", "items"):
+            grid.register(name, self.groups[name])
+        if self.projectiles is None:
+            for name in ("beams", "bombs", "boss_beams"):
+                grid.register(name, self.groups[name])
+        proj = grid if self.projectiles is None else self.projectiles  # 弾との判定の問い合わせ先
+        prof.lap("collide.grid")
+
+        for emy in proj.groupcollide(self.emys, "beams", True, True).keys():
+            self.exps.spawn(emy.rect.center, 100)  # 爆発エフェクト
+            self.score.value += 10  # 10点アップ
+            self.enemy_count += 1  # 敵を倒した数を増やす
 
             # 5体倒すごとにアイテムをドロップ
-            if enemy_count % 5 == 0:
-                items.add(Item(emy.rect.center))
+            if self.enemy_count % 5 == 0:
+                self.items.add(Item(emy.rect.center))
+        prof.lap("collide.emys")
 
-        for b_emy in pg.sprite.groupcollide(b_emys, beams, True, True).keys():
-            exps.add(Explosion(b_emy, 100))  # 爆発エフェクト
-            score.value += 10  # 10点アップ
-            bird.change_img(6, screen)  # こうかとん喜びエフェクト
-        
-        
-        for sp_emy in pg.sprite.groupcollide(sp_emys, beams , False, True).keys():
-            sp_emy.damage()
-            if sp_emy.lifestate == "dead":
-                exps.add(Explosion(sp_emy, 100))
-                score.value += 50
+        for b_emy in proj.groupcollide(self.b_emys, "beams", True, True).keys():
+            self.exps.spawn(b_emy.rect.center, 100)  # 爆発エフェクト
+            self.score.value += 10  # 10点アップ
+        prof.lap("collide.b_emys")
 
-        for b_emy in pg.sprite.groupcollide(b_emys, beams, True, True).keys():
-            exps.add(Explosion(b_emy, 100))  # 爆発エフェクト
-            score.value += 10  # 10点アップ
-            bird.change_img(6, screen)  # こうかとん喜びエフェクト
-        
-        
-        for sp_emy in pg.sprite.groupcollide(sp_emys, beams , False, True).keys():
+        for sp_emy in proj.groupcollide(self.sp_emys, "beams", False, True).keys():
             sp_emy.damage()
             if sp_emy.lifestate == "dead":
-                exps.add(Explosion(sp_emy, 100))
-                score.value += 50
-
-        #[Bomb(emy, bird),Bomb(emy, bird),Bomb(emy, bird)......]
-        
-        if pg.sprite.spritecollide(bird, items, True):
-            bird.speed += 5  # スピードアップ効果
-        if pg.sprite.spritecollide(bird_2p, items, True):
-            bird_2p.speed += 5  # スピードアップ効果
-
-        if bird.state=="alive":
-            if len(pg.sprite.spritecollide(bird, emys, True)) != 0 or len(pg.sprite.spritecollide(bird, sp_emys, True)) != 0 or len(pg.sprite.spritecollide(bird, b_emys, True)) != 0:
-                bird.dead()
-        
-        if bird_2p.state=="alive":
-            if len(pg.sprite.spritecollide(bird_2p, emys, True)) != 0 or len(pg.sprite.spritecollide(bird_2p, sp_emys, True)) != 0 or len(pg.sprite.spritecollide(bird_2p, b_emys, True)) != 0:
-                bird_2p.dead()    
-        
-        
-        for boss_hit in pg.sprite.groupcollide(boss, beams, False, True).keys():
-            for beam in beams:
-                if beam.rect.colliderect(boss_hit.rect):
-                    exps.add(Explosion(beam, 100))
-                    beam.kill()
+                self.exps.spawn(sp_emy.rect.center, 100)
+                self.score.value += 50
+        prof.lap("collide.sp_emys")
+
+        for b in birds:
+            if grid.spritecollide(b, "items", True):
+                b.speed += 5  # スピードアップ効果
+        prof.lap("collide.items")
+
+        for b in birds:
+            if b.state=="alive":
+                if len(grid.spritecollide(b, "emys", True)) != 0 or len(grid.spritecollide(b, "sp_emys", True)) != 0 or len(grid.spritecollide(b, "b_emys", True)) != 0:
+                    self.hit(b)
+        prof.lap("collide.birds")
+
+        for boss_hit, hit_beams in proj.groupcollide(self.boss, "beams", False, True).items():
+            for beam in hit_beams:  # ボスに当たったビームの位置で爆発
+                self.exps.spawn(beam.rect.center, 100)
             boss_hit.health -= 1
             if boss_hit.health <= 0:
-                exps.add(Explosion(boss_hit, 100))
-                score.value += 100
+                self.exps.spawn(boss_hit.rect.center, 100)
+                self.score.value += 100
                 boss_hit.kill()
-                bird.change_img(6, screen)
-
-                font = pg.font.Font(None, 80)
-                clear_text = font.render("GAME CLEAR!", True, (0, 255, 0))
-                text_rect = clear_text.get_rect(center = (WIDTH // 2, HEIGHT // 2))
-                screen.blit(clear_text, text_rect)
-                pg.display.update()
-                time.sleep(3)
+                self.state = "clear"
+                prof.lap("collide.boss")
                 return
-        if bird.state=="alive":
-            if len(pg.sprite.spritecollide(bird, bombs, True)) != 0:
-                bird.dead()
-        
-        if bird_2p.state=="alive":
-            if len(pg.sprite.spritecollide(bird_2p, bombs, True)) != 0:
-                bird_2p.dead()
-        
-        if bird.state=="alive":
-            if pg.sprite.spritecollide(bird, boss_beams, True):
-                bird.dead()
-            
-        if bird_2p.state=="alive":
-            if pg.sprite.spritecollide(bird_2p, boss_beams, True):
-                bird_2p.dead()
-            
-        
-        if bird.state=="dead" and bird_2p.state=="dead":
-            game_over(screen)
+        prof.lap("collide.boss")
+
+        for b in birds:
+            if b.state=="alive":
+                if len(proj.spritecollide(b, "bombs", True)) != 0:
+                    self.hit(b)
+        prof.lap("collide.bombs")
+
+        for b in birds:
+            if b.state=="alive":
+                if proj.spritecollide(b, "boss_beams", True):
+                    self.hit(b)
+        prof.lap("collide.boss_beams")
+
+        if all(b.state=="dead" for b in birds):
+            self.state = "over"
+
+    def close(self):
+        """
+        ラウンドを終えるときに，残っているスプライトを消してプールに戻す
+        """
+        for group in self.groups.values():
+            if isinstance(group, pg.sprite.AbstractGroup):
+                for sprite in group.sprites():
+                    sprite.kill()
+            else:
+                group.empty()
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        """
+        このGameのプールの利用状況をクラス名ごとに返す
+        """
+        return {cls.__name__: pool.stats() for cls, pool in self.pools.items()}
+
+    def snapshot(self) -> "GameState":
+        """
+        ゲームの状態を取り出す（毎フレーム呼んでもよい軽さ．ロールバック・リトライ・巻き戻し・探索用）
+        戻り値：restore()に渡すGameState
+        """
+        state = GameState()
+        state.tmr = self.tmr
+        state.state = self.state
+        state.score = self.score.value
+        state.enemy_count = self.enemy_count
+        version, internal, gauss = self.rng.getstate()
+        state.rng = version, array.array("I", internal), gauss  # 625個のintのタプルの約1/10の大きさ
+        state.waves = tuple(self.waves.queue)
+        state.despawned = tuple(self.lifecycle.despawned.items())
+        state.birds = SpriteStates(self.birds)
+        state.groups = tuple((group, SpriteStates(group)) for group in self.groups.values()
+                             if isinstance(group, pg.sprite.AbstractGroup))
+        state.exps = self.exps.snapshot()
+        state.projectiles = self.projectiles.snapshot() if self.projectiles is not None else None
+        return state
+
+    def restore(self, state: "GameState"):
+        """
+        snapshot()の時点の状態に戻す（同じGameStateを何度戻してもよい）
+        その後に生成されたスプライトは捨て，その時点で生きていたスプライトはプールから取り戻す
+        引数 state：このGameのsnapshot()の戻り値
+        """
+        self.tmr = state.tmr
+        self.state = state.state
+        self.score.value = state.score
+        self.enemy_count = state.enemy_count
+        version, internal, gauss = state.rng
+        self.rng.setstate((version, tuple(internal), gauss))
+        self.waves.queue = list(state.waves)
+        self.lifecycle.despawned = dict(state.despawned)
+        state.birds.restore()
+        alive = set()
+        for group, sprites in state.groups:
+            kept = list(sprites.restore())
+            current = group.sprites()
+            if current[:len(kept)] == kept:  # その後に追加されただけなら，追加された分だけ外す
+                group.remove(current[len(kept):])
+            else:  # 消えたスプライトがあれば，並び順も戻すために入れ直す
+                group.empty()  # killしないのでプールには戻らない
+                group.add(kept)
+            alive.update(map(id, kept))
+        for pool in self.pools.values():
+            pool.discard(alive)
+        self.exps.restore(state.exps)
+        if self.projectiles is not None:
+            self.projectiles.restore(state.projectiles)
+
+    def checksum(self) -> int:
+        """
+        ゲームの状態（タイマー，スコア，こうかとん，全スプライトの位置，乱数）のチェックサムを返す
+        リプレイ再生時に記録時と同じ展開になったかの確認に使う
+        """
+        parts = [self.tmr, self.score.value, self.enemy_count, self.state, self.rng.getstate()]
+        for b in self.birds:
+            parts.append((b.rect.topleft, b.state, b.speed, b.charge_time, b.is_charging))
+        for name, group in self.groups.items():
+            if isinstance(group, pg.sprite.AbstractGroup):
+                parts.append((name, [sprite.rect.topleft for sprite in group]))
+            else:  # 配列版の弾もスプライト版と同じ形にするので，どちらで処理しても同じ値になる
+                parts.append((name, group.toplefts()))
+        return zlib.crc32(repr(parts).encode())
+
+    def hit(self, bird: Bird):
+        """
+        こうかとんを行動不能にする（無敵設定なら何もしない）
+        引数 bird：攻撃を受けたこうかとん
+        """
+        if not self.invincible:
+            bird.dead()
+
+    def store_prev(self):
+        """
+        フレームを進める前の位置を，補間描画用に各スプライトに保存する
+        """
+        for b in self.birds:
+            b.prev_topleft = b.rect.topleft
+        for group in self.groups.values():
+            if isinstance(group, pg.sprite.AbstractGroup):
+                for sprite in group:
+                    sprite.prev_topleft = sprite.rect.topleft
+        if self.projectiles is not None:
+            self.projectiles.store_prev()
+
+    @staticmethod
+    def lerp_rect(sprite: pg.sprite.Sprite, alpha: float | None) -> pg.Rect:
+        """
+        前フレームと現フレームの位置を補間した描画Rectを返す
+        引数1 sprite：描画するスプライト
+        引数2 alpha：補間率（0：前フレーム，1：現フレーム，None：現フレーム）
+        """
+        prev = getattr(sprite, "prev_topleft", None)
+        if alpha is None or prev is None:
+            return sprite.rect.copy()
+        x = prev[0] + (sprite.rect.x-prev[0])*alpha
+        y = prev[1] + (sprite.rect.y-prev[1])*alpha
+        return pg.Rect(round(x), round(y), sprite.rect.width, sprite.rect.height)
+
+    def draw(self, screen: pg.Surface, alpha: float | None = None):
+        """
+        こうかとん，各スプライトグループ，スコアを画面に転送する
+        引数1 screen：画面Surface
+        引数2 alpha：前フレームから現フレームへの補間率（Noneなら補間しない）
+        """
+        lerp = __class__.lerp_rect
+        prof = self.prof
+        prof.skip()
+        for b in self.birds:
+            b.draw(screen, lerp(b, alpha))
+        prof.lap("draw.birds")
+        for name in ("beams", "emys", "b_emys", "sp_emys", "bombs"):
+            self._draw_group(screen, self.groups[name], alpha)
+            prof.lap(f"draw.{name}")
+        if self.projectiles is not None:
+            self.projectiles.draw(screen, alpha)
+            prof.lap("draw.projectiles")
+        for name in ("exps", "boss_beams", "boss", "items"):  # アイテムも描画
+            self._draw_group(screen, self.groups[name], alpha)
+            prof.lap(f"draw.{name}")
+        self.score.update(screen)
+        prof.lap("hud")
+
+    def _draw_group(self, screen: pg.Surface, group, alpha: float | None):
+        """
+        スプライトグループを補間した位置に転送する
+        引数1 screen：画面Surface
+        引数2 group：描画するグループ
+        引数3 alpha：補間率（Noneなら現在位置）
+        """
+        if alpha is None or not isinstance(group, pg.sprite.AbstractGroup):
+            group.draw(screen)
             return
-        
+        lerp = __class__.lerp_rect
+        screen.blits([(sprite.image, lerp(sprite, alpha)) for sprite in group], False)
 
-        bird.update(key_lst, screen)
-        
-        bird_2p.update(key_lst, screen)
-        beams.update()
-        beams.draw(screen)
-        emys.update()
-        emys.draw(screen)
-        b_emys.update()
-        b_emys.draw(screen)
-        sp_emys.update()
-        sp_emys.draw(screen)
-        bombs.update()
-        bombs.draw(screen)
-        exps.update()
-        exps.draw(screen)
-        boss.update(tmr)
-        boss_beams.update()
-        boss_beams.draw(screen)
-        boss.draw(screen)
-        items.update()  # アイテムの更新（時間経過チェック）
-        items.draw(screen)  # アイテムの描画
-        score.update(screen)
-        
+    def drawn_rects(self, alpha: float | None = None) -> list[pg.Rect]:
+        """
+        draw()で描画される領域のRectのリストを返す
+        引数 alpha：draw()に渡した補間率
+        """
+        lerp = __class__.lerp_rect
+        rects = []
+        for b in self.birds:
+            if b.state == "alive":  # チャージエフェクト（最大半径50）も含める
+                r = lerp(b, alpha)
+                rects.append(r.inflate(max(0, 102-r.width), max(0, 102-r.height)))
+        for group in self.groups.values():
+            if isinstance(group, pg.sprite.AbstractGroup):
+                rects.extend(lerp(sprite, alpha) for sprite in group)
+            elif isinstance(group, EffectField):
+                rects.extend(group.rects())
+        if self.projectiles is not None:
+            rects.extend(self.projectiles.rects(alpha))
+        rects.append(self.score.image.get_rect(topleft=self.score.rect.topleft))
+        return rects
+
+
+class DirtyRenderer:
+    """
+    前フレームと今フレームの描画領域だけを画面に反映するクラス
+    背景がスクロールしたフレームや，変化した面積が大きいフレームは画面全体を更新する
+    """
+    def __init__(self, bg: Background, max_ratio: float = 0.4):
+        """
+        引数1 bg：背景
+        引数2 max_ratio：変化した面積が画面のこの割合を超えたら全体を更新する
+        """
+        self.bg = bg
+        self.max_ratio = max_ratio
+        self.prev: list[pg.Rect] = []  # 前フレームの描画領域
+        self.last_scroll: int | None = None  # 前フレームの背景スクロール量
+        self.full_frames = 0  # 全体を更新したフレーム数
+        self.dirty_frames = 0  # 変化した領域だけを更新したフレーム数
+
+    def render(self, screen: pg.Surface, game: Game, scroll: int, alpha: float | None = None,
+               overlay=None):
+        """
+        ゲーム画面を描画し，必要な領域をディスプレイに反映する
+        引数1 screen：画面Surface
+        引数2 game：描画するゲーム
+        引数3 scroll：背景のスクロール量
+        引数4 alpha：スプライト位置の補間率（Noneなら補間しない）
+        引数5 overlay：最後に重ねて描く関数（画面Surfaceを受け取り，描いたRectかNoneを返す）
+        """
+        full = scroll != self.last_scroll
+        if not full:
+            area = sum(r.width*r.height for r in self.prev)
+            full = area > self.max_ratio*WIDTH*HEIGHT
+        if full:
+            self.bg.draw(screen, scroll)
+        else:
+            for rect in self.prev:  # 前フレームに描いた所を背景で消す
+                screen.set_clip(rect)
+                self.bg.draw(screen, scroll)
+            screen.set_clip(None)
+        game.prof.lap("draw.bg")
+        game.draw(screen, alpha)
+        cur = game.drawn_rects(alpha)
+        if overlay is not None:
+            rect = overlay(screen)
+            if rect is not None:
+                cur.append(rect)
+        game.prof.lap("overlay")
+        dirty = self.prev + cur
+        if full or sum(r.width*r.height for r in dirty) > self.max_ratio*WIDTH*HEIGHT:
+            pg.display.update()
+            self.full_frames += 1
+        else:
+            pg.display.update(dirty)
+            self.dirty_frames += 1
+        game.prof.lap("display")
+        self.prev = cur
+        self.last_scroll = scroll
+
+    def invalidate(self):
+        """
+        次のフレームで画面全体を描き直すようにする（他の場面から戻ったときに呼ぶ）
+        """
+        self.prev = []
+        self.last_scroll = None
+
+
+class Replay:
+    """
+    ゲームのシードと毎フレームの入力ビットを記録し，同じ展開を再生するためのクラス
+    ファイル：ヘッダ（識別子，版，シード，フレーム数，人数，フラグ，最終状態のチェックサム）の後に
+    「フレーム数×人数」バイトの入力列をzlibで圧縮して保存する
+    """
+    magic = b"KKRP"
+    version = 2  # 2：近くの爆発をまとめるようになった（同じ入力でも版1とは展開が変わる）
+    header = struct.Struct("<4sHqIBBI")
+    FLAG_VECTOR = 1  # 弾を配列版で処理したゲーム
+    FLAG_PRECISE = 2  # 画像の不透明部分で当たり判定したゲーム
+
+    def __init__(self, seed: int, players: int = 2, vector: bool = False, precise: bool = False):
+        """
+        引数1 seed：ゲームのシード
+        引数2 players：こうかとんの数
+        引数3 vector：弾を配列版で処理するかどうか
+        引数4 precise：画像の不透明部分で当たり判定するかどうか
+        """
+        self.seed = seed
+        self.players = players
+        self.vector = vector
+        self.precise = precise
+        self.inputs = bytearray()  # フレーム順に人数分ずつ並べた入力ビット
+        self.checksum: int | None = None  # 記録終了時のGame.checksum()
+
+    def __len__(self) -> int:
+        return len(self.inputs)//self.players
+
+    def record(self, inputs: tuple[int, ...]):
+        """
+        1フレーム分の入力を追加する
+        引数 inputs：こうかとんごとの入力ビット
+        """
+        self.inputs.extend(inputs)
+
+    def inputs_at(self, tick: int) -> tuple[int, ...]:
+        """
+        指定したフレームの入力を返す
+        引数 tick：フレーム番号
+        """
+        i = tick*self.players
+        return tuple(self.inputs[i:i+self.players])
+
+    def save(self, path: str):
+        """
+        ファイルに保存する
+        引数 path：保存先のパス
+        """
+        flags = (__class__.FLAG_VECTOR if self.vector else 0) | (__class__.FLAG_PRECISE if self.precise else 0)
+        with open(path, "wb") as f:
+            f.write(__class__.header.pack(__class__.magic, __class__.version, self.seed, len(self),
+                                          self.players, flags, self.checksum or 0))
+            f.write(zlib.compress(bytes(self.inputs), 9))
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        """
+        ファイルから読み込む
+        引数 path：リプレイファイルのパス
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, seed, ticks, players, flags, checksum = cls.header.unpack_from(data)
+        if magic != cls.magic:
+            raise ValueError(f"リプレイファイルではありません：{path}")
+        if version != cls.version:
+            raise ValueError(f"リプレイファイルの版（{version}）がこのゲームの版（{cls.version}）と違うので再生できません：{path}")
+        replay = cls(seed, players, bool(flags & cls.FLAG_VECTOR), bool(flags & cls.FLAG_PRECISE))
+        replay.inputs = bytearray(zlib.decompress(data[cls.header.size:]))
+        if len(replay) != ticks:
+            raise ValueError(f"リプレイファイルが壊れています：{path}")
+        replay.checksum = checksum
+        return replay
+
+
+def game_clear(screen: pg.Surface):
+    """
+    ゲームクリアの文字を表示する
+    引数 screen：画面Surface
+    """
+    clear_text = TEXT.render("GAME CLEAR!", 80, (0, 255, 0))
+    text_rect = clear_text.get_rect(center = (WIDTH // 2, HEIGHT // 2))
+    screen.blit(clear_text, text_rect)
+    hint = TEXT.render("ENTER: RETRY   ESC: TITLE", 40, (255, 255, 255))
+    screen.blit(hint, hint.get_rect(center=(WIDTH//2, HEIGHT-80)))
+
+
+def title_screen(screen: pg.Surface):
+    """
+    タイトル画面の文字と操作説明を表示する
+    引数 screen：画面Surface
+    """
+    title = TEXT.render("KOKATON MUSOU", 110, (255, 255, 0))
+    screen.blit(title, title.get_rect(center=(WIDTH//2, HEIGHT//3)))
+    lines = ("PRESS ENTER TO START", "1P: ARROWS + SPACE    2P: WASD + LSHIFT",
+             "3P: IJKL + RSHIFT    4P: NUMPAD 8456 + 0", "P / ESC: PAUSE")
+    for i, line in enumerate(lines):
+        txt = TEXT.render(line, 40, (255, 255, 255))
+        screen.blit(txt, txt.get_rect(center=(WIDTH//2, HEIGHT//2+60+i*50)))
+
+
+def loading_screen(screen: pg.Surface, progress: float):
+    """
+    読み込み中の画面と進み具合のバーを表示する
+    引数1 screen：画面Surface
+    引数2 progress：読み込みが終わった割合（0～1）
+    """
+    screen.fill((0, 0, 0))
+    txt = TEXT.render("LOADING...", 60, (255, 255, 255))
+    screen.blit(txt, txt.get_rect(center=(WIDTH//2, HEIGHT//2-50)))
+    bar = pg.Rect(0, 0, WIDTH//2, 24)
+    bar.center = WIDTH//2, HEIGHT//2+20
+    pg.draw.rect(screen, (255, 255, 255), bar, 2)
+    pg.draw.rect(screen, (255, 255, 0), (bar.x+4, bar.y+4, int((bar.width-8)*progress), bar.height-8))
+
+
+def preload_assets(screen: pg.Surface | None, assets: Assets = ASSETS,
+                   bundle: str | None = BUNDLE) -> dict[str, float]:
+    """
+    PRELOADの画像を読み込む．デコードは別スレッドで行い，その間は読み込み画面を表示し続ける
+    引数1 screen：画面Surface（Noneなら画面を出さずに終わるまで待つ）
+    引数2 assets：読み込み先の画像キャッシュ
+    引数3 bundle：先に読み込むまとめファイルのパス（Noneなら画像ファイルだけを読む）
+    戻り値：デコード・変換・全体の秒数の辞書
+    """
+    loader = Preloader(assets, bundle=bundle).start()
+    clock = pg.time.Clock()
+    while screen is not None and loader.running():
+        pg.event.pump()  # 読み込み中も応答なしにならないようにする（終了イベントは後のループで処理）
+        loading_screen(screen, loader.progress())
         pg.display.update()
-        tmr += 1
-        bg_tmr +=4
-        clock.tick(50)
+        clock.tick(60)
+    return loader.finish()
+
+
+def pause_screen(screen: pg.Surface):
+    """
+    一時停止中の画面を表示する
+    引数 screen：画面Surface
+    """
+    screen.fill((0, 0, 0, 120))
+    txt = TEXT.render("PAUSE", 80, (255, 255, 255))
+    screen.blit(txt, txt.get_rect(center=(WIDTH//2, HEIGHT//2)))
+    hint = TEXT.render("P / ESC: RESUME", 40, (255, 255, 255))
+    screen.blit(hint, hint.get_rect(center=(WIDTH//2, HEIGHT//2+70)))
+
+
+class SceneManager:
+    """
+    タイトル・プレイ中・一時停止・ゲームオーバー・クリアの場面を切り替えるクラス
+    どの場面でもイベント処理とフレームの間隔は止めず，場面の切り替えはキー入力か時間で行う
+    """
+    keys = {  # （場面，キー） → 次の場面
+        ("title", pg.K_RETURN): "playing",
+        ("playing", pg.K_p): "pause",
+        ("playing", pg.K_ESCAPE): "pause",
+        ("pause", pg.K_p): "playing",
+        ("pause", pg.K_ESCAPE): "playing",
+        ("over", pg.K_RETURN): "playing",
+        ("over", pg.K_ESCAPE): "title",
+        ("clear", pg.K_RETURN): "playing",
+        ("clear", pg.K_ESCAPE): "title",
+    }
+    screens = {  # 場面 → 重ねて描く関数
+        "title": title_screen,
+        "pause": pause_screen,
+        "over": game_over,
+        "clear": game_clear,
+    }
+    hold = {"over": 5.0, "clear": 3.0}  # リプレイ再生時に結果を表示してから終了するまでの秒数
+
+    def __init__(self, scene: str = "title"):
+        """
+        引数 scene：最初の場面
+        """
+        self.scene = scene
+        self.entered = time.perf_counter()  # 今の場面になった時刻
+        self.layers: dict[str, pg.Surface] = {}  # 場面 → 重ねて描く画像（初めて描くときに作る）
+
+    def change(self, scene: str):
+        """
+        場面を切り替える
+        引数 scene：次の場面
+        """
+        self.scene = scene
+        self.entered = time.perf_counter()
+
+    def elapsed(self) -> float:
+        """
+        今の場面になってからの秒数を返す
+        """
+        return time.perf_counter()-self.entered
+
+    def on_key(self, key: int) -> str | None:
+        """
+        押されたキーに対応する次の場面を返す（なければNone）
+        引数 key：押されたキー
+        """
+        return self.keys.get((self.scene, key))
+
+    def draw(self, screen: pg.Surface):
+        """
+        今の場面の文字や暗幕を画面に重ねる（プレイ中は何もしない）
+        引数 screen：画面Surface
+        """
+        draw = self.screens.get(self.scene)
+        if draw is None:
+            return
+        layer = self.layers.get(self.scene)
+        if layer is None:
+            layer = self.layers[self.scene] = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
+            draw(layer)
+        screen.blit(layer, (0, 0))
+
+
+def main(vector: bool = False, dirty: bool = False, bg_speed: float = 4, max_fps: int = 144,
+         profile_out: str | None = None, seed: int | None = None,
+         record: str | None = None, replay: Replay | None = None, level: str = LEVEL,
+         players: int = 2, bots: bool = False, precise: bool = False,
+         effects_budget: float = EFFECTS_BUDGET):
+    """
+    ゲームを画面付きで実行する
+    ゲームロジックはFPSの固定間隔で進め，描画はそれとは別にmax_fpsまで行う
+    タイトル・プレイ中・一時停止・ゲームオーバー・クリアの場面はSceneManagerで切り替え，
+    どの場面でもイベント処理を止めない（リトライ時は読み込み済みの画像をそのまま使う）
+    F3キーで処理時間のオーバーレイを表示する
+    引数1 vector：Trueなら弾を配列版（ProjectileField）で処理する
+    引数2 dirty：Trueなら変化した領域だけをディスプレイに反映する
+    引数3 bg_speed：背景の1フレームあたりのスクロール量
+    引数4 max_fps：描画の最大フレームレート（0なら制限なし）
+    引数5 profile_out：終了時に処理時間の記録を保存するパス（.jsonまたは.csv）
+    引数6 seed：乱数のシード（Noneならランダムに決める）
+    引数7 record：入力を記録するリプレイファイルのパス
+    引数8 replay：キーボードの代わりに入力を再生するリプレイ
+    引数9 level：敵の出現スケジュールを書いたステージファイルのパス
+    引数10 players：こうかとんの数
+    引数11 bots：Trueなら全員を自動操作（BotInput）にする
+    引数12 precise：Trueなら画像の不透明部分で当たり判定する
+    引数13 effects_budget：爆発エフェクトの描画に1フレームで使ってよい時間（ミリ秒）
+    """
+
+    pg.display.set_caption("真！こうかとん無双")
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    preload_assets(screen)
+    Bomb.prerender()
+    bg = Background([("fig/pg_bg.jpg", 1.0)])
+    clock  = pg.time.Clock()
+    prof = Profiler(keep_records=profile_out is not None)
+    if replay is not None:
+        seed, vector, players, precise = replay.seed, replay.vector, replay.players, replay.precise
+        bindings = [ReplayInput(replay, i) for i in range(players)]
+    else:
+        bindings = input_bindings(players, bots, seed)
+    renderer = DirtyRenderer(bg) if dirty else None
+    scenes = SceneManager("title" if replay is None else "playing")
+    game = recorder = None
+    pools = new_pools()  # ラウンドは1つずつ進めるので，前のラウンドが戻したスプライトを次のラウンドで使い回す
+    tick = 1/FPS  # ゲームロジック1フレームの秒数
+    acc = 0.0  # まだ進めていない経過時間
+    last = time.perf_counter()
+    scroll = 0
+
+    try:
+        while True:
+            prof.begin_frame()
+            scene = scenes.scene
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    return 0
+                if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                    prof.visible = not prof.visible  # オーバーレイの表示切り替え
+                elif event.type == pg.KEYDOWN:
+                    nxt = scenes.on_key(event.key)
+                    if nxt is not None:
+                        scenes.change(nxt)
+            if game is not None and scenes.scene in ("title", "playing") and scene in ("over", "clear"):
+                game.close()  # 終わったラウンドの弾や爆発をプールに戻す
+                game = None
+            if game is None and scenes.scene == "playing":
+                # 新しいラウンドを始める（画像やプールは読み込み済みのものを使い回す）
+                round_seed = seed if seed is not None else random.randrange(2**32)
+                game = Game(vector, prof, round_seed, level, players, precise, effects_budget, pools)
+                recorder = Replay(round_seed, players, vector, precise) if record is not None else None
+            if scenes.scene == "playing" and scene != "playing" and renderer is not None:
+                renderer.invalidate()  # 他の場面から戻ったら画面全体を描き直す
+            prof.lap("events")
+
+            # 経過時間をためておき，1/FPS秒ごとにゲームを1フレーム進める
+            # 長く止まったときはMAX_CATCHUPフレーム分だけ追いつき，残りは切り捨てる
+            # プレイ中以外は時間をためない（一時停止から戻ったときに早送りしない）
+            now = time.perf_counter()
+            acc = min(acc+now-last, MAX_CATCHUP*tick) if scenes.scene == "playing" else 0.0
+            last = now
+            key_lst = pg.key.get_pressed()
+            while acc >= tick and scenes.scene == "playing":
+                if replay is not None and game.tmr >= len(replay):
+                    print(replay_result(game, replay))
+                    return 0
+                inputs = tuple(binding.read(key_lst, game.tmr) for binding in bindings)
+                if recorder is not None:
+                    recorder.record(inputs)
+                state = game.step(inputs)
+                if state != "playing":
+                    scenes.change(state)  # "over"か"clear"
+                    if recorder is not None:
+                        recorder.checksum = game.checksum()
+                        recorder.save(record)
+                        recorder = None
+                acc -= tick
+            if replay is not None and scenes.scene in scenes.hold and scenes.elapsed() >= scenes.hold[scenes.scene]:
+                return 0
+
+            alpha = acc/tick if scenes.scene == "playing" else None  # 前フレームから次フレームまでの補間率
+            if game is not None:
+                scroll = int(bg_speed*(game.tmr-1+(1 if alpha is None else alpha)))
+            elif bg_speed:
+                scroll += 1  # タイトル画面では背景をゆっくり流す
+            prof.skip()
+            if renderer is not None and scenes.scene == "playing":
+                renderer.render(screen, game, scroll, alpha, prof.draw_overlay)
+            else:
+                bg.draw(screen, scroll)
+                prof.lap("draw.bg")
+                if game is not None:
+                    game.draw(screen, alpha)
+                scenes.draw(screen)
+                prof.draw_overlay(screen)
+                prof.lap("overlay")
+                pg.display.update()
+                prof.lap("display")
+            prof.end_frame(game.lifecycle.live_counts() if game is not None else None)
+            clock.tick(max_fps)
+    finally:
+        if profile_out is not None:
+            prof.dump(profile_out)
+        if recorder is not None:  # ラウンドの途中で終了したときはそこまでを保存する
+            recorder.checksum = game.checksum()
+            recorder.save(record)
+
+
+def replay_result(game: Game, replay: Replay) -> dict:
+    """
+    リプレイを最後まで再生したゲームの結果を返す
+    引数1 game：再生したゲーム
+    引数2 replay：再生したリプレイ
+    戻り値：フレーム数，スコア，進行状態，記録時とチェックサムが一致したかの辞書
+    """
+    return {
+        "frames": game.tmr,
+        "score": game.score.value,
+        "state": game.state,
+        "in_sync": game.checksum() == replay.checksum,
+    }
+
+
+def run_headless(frames: int, seed: int | None = None, vector: bool = False,
+                 profile_out: str | None = None, record: str | None = None,
+                 replay: Replay | None = None, level: str = LEVEL, players: int = 2,
+                 bots: bool = False, precise: bool = False) -> dict:
+    """
+    画面を作らず，フレームレート制限なしでゲームを進める
+    引数1 frames：進める最大フレーム数
+    引数2 seed：乱数のシード（Noneなら固定しない）
+    引数3 vector：Trueなら弾を配列版（ProjectileField）で処理する
+    引数4 profile_out：処理時間の記録を保存するパス（Noneなら計測しない）
+    引数5 record：入力を記録するリプレイファイルのパス
+    引数6 replay：再生するリプレイ（指定時はそのシード・設定・入力で最後まで早送りする）
+    引数7 level：敵の出現スケジュールを書いたステージファイルのパス
+    引数8 players：こうかとんの数
+    引数9 bots：Trueなら全員を自動操作（BotInput）にする（Falseなら何も入力しない）
+    引数10 precise：Trueなら画像の不透明部分で当たり判定する
+    戻り値：経過フレーム数，スコア，進行状態，実行時間，フレーム毎秒，プールの利用状況の辞書
+    """
+    if replay is not None:
+        seed, vector, frames, players = replay.seed, replay.vector, len(replay), replay.players
+        precise = replay.precise
+    elif seed is None and record is not None:
+        seed = random.randrange(2**32)
+    if replay is not None:
+        bindings = [ReplayInput(replay, i) for i in range(players)]
+    else:
+        bindings = input_bindings(players, True, seed) if bots else []
+    no_input = (0,)*players  # 何も押していない入力
+    prof = Profiler(enabled=profile_out is not None, keep_records=True)
+    game = Game(vector, prof, seed, level, players, precise)
+    recorder = Replay(seed, players, vector, precise) if record is not None else None
+    start = time.perf_counter()
+    while game.tmr < frames:
+        inputs = tuple(binding.read(None, game.tmr) for binding in bindings) if bindings else no_input
+        if recorder is not None:
+            recorder.record(inputs)
+        prof.begin_frame()
+        state = game.step(inputs)
+        prof.end_frame(game.lifecycle.live_counts())
+        if state != "playing":
+            break
+    elapsed = time.perf_counter() - start
+    if profile_out is not None:
+        prof.dump(profile_out)
+    if recorder is not None:
+        recorder.checksum = game.checksum()
+        recorder.save(record)
+    result = replay_result(game, replay) if replay is not None else {}
+    return result | {
+        "frames": game.tmr,
+        "score": game.score.value,
+        "state": game.state,
+        "seconds": elapsed,
+        "fps": game.tmr/elapsed if elapsed > 0 else 0.0,
+        "live": game.lifecycle.live_counts(),
+        "despawned": game.lifecycle.despawned,
+        "pools": game.pool_stats(),
+    }
+
+
+def startup_report() -> dict:
+    """
+    起動時間を計測する
+    import：別プロセスでmusou_kokatonをimportする時間
+    cold：空のキャッシュに画像ファイルを1つずつ読み込み，変換する時間
+    bundle：まとめファイル（build_atlas.pyで作る）から読み込み，変換する時間（ファイルがあれば）
+    warm：デコード済みの画像を残し，変換だけやり直す時間（2回目以降の起動に相当）
+    cached：すべてキャッシュ済みの時間（リトライ時に相当）
+    bombs：爆弾の見た目をすべて描画しておく時間
+    戻り値：各段階の秒数の辞書
+    """
+    code = "import time; t = time.perf_counter(); import musou_kokaton; print(time.perf_counter()-t)"
+    env = os.environ | {"PYTHONPATH": BASE_DIR, "PYGAME_HIDE_SUPPORT_PROMPT": "1"}
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    report = {"import": float(out.stdout.split()[-1])}
+    if pg.display.get_surface() is None:
+        pg.display.set_mode((WIDTH, HEIGHT))
+    assets = Assets()
+    report["cold"] = preload_assets(None, assets, None)
+    if os.path.exists(BUNDLE):
+        report["bundle"] = preload_assets(None, Assets())
+    warm = Assets()
+    warm.raw = assets.raw
+    report["warm"] = preload_assets(None, warm, None)
+    report["cached"] = preload_assets(None, warm, None)
+    report["bombs"] = Bomb.prerender()
+    report["files"] = len(assets.raw)
+    report["variants"] = len(assets.variants)
+    return report
 
 
 if __name__ == "__main__":
-    pg.init()
-    main()
+    parser = argparse.ArgumentParser(description="真！こうかとん無双")
+    parser.add_argument("--headless", action="store_true", help="画面なしで高速にシミュレーションする")
+    parser.add_argument("--frames", type=int, default=10000, help="ヘッドレス時の最大フレーム数")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    parser.add_argument("--vector", action="store_true", help="弾をNumPy配列でまとめて処理する")
+    parser.add_argument("--dirty", action="store_true", help="変化した領域だけを画面に反映する")
+    parser.add_argument("--bg-speed", type=float, default=4, help="背景の1フレームあたりのスクロール量")
+    parser.add_argument("--max-fps", type=int, default=144, help="描画の最大フレームレート（0なら制限なし）")
+    parser.add_argument("--profile-out", default=None, help="処理時間の記録を保存するパス（.jsonまたは.csv）")
+    parser.add_argument("--record", default=None, help="入力を記録するリプレイファイルのパス")
+    parser.add_argument("--replay", default=None, help="再生するリプレイファイルのパス（--headlessなら早送り）")
+    parser.add_argument("--level", default=LEVEL, help="敵の出現スケジュールを書いたステージファイルのパス")
+    parser.add_argument("--players", type=int, default=2, choices=range(1, MAX_PLAYERS+1),
+                        help="こうかとんの数（キーボードの割り当てが足りない分はジョイスティック）")
+    parser.add_argument("--bots", action="store_true", help="全員を自動操作にする（耐久テスト用）")
+    parser.add_argument("--precise", action="store_true", help="画像の不透明部分で当たり判定する")
+    parser.add_argument("--effects-budget", type=float, default=EFFECTS_BUDGET,
+                        help="爆発エフェクトの描画に1フレームで使ってよいミリ秒")
+    parser.add_argument("--startup-report", action="store_true", help="importと画像読み込みの時間を計測して表示する")
+    args = parser.parse_args()
+    if args.effects_budget <= 0:
+        parser.error("--effects-budgetは正の値にしてください")
+    try:
+        replay = Replay.load(args.replay) if args.replay else None
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if (args.vector or (replay is not None and replay.vector)) and load_numpy() is None:
+        parser.error("--vectorにはNumPyが必要です")
+    if args.startup_report:
+        pg.init()
+        print(json.dumps(startup_report(), indent=2))
+    elif args.headless:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        pg.init()
+        print(run_headless(args.frames, args.seed, args.vector, args.profile_out, args.record, replay, args.level,
+                           args.players, args.bots, args.precise))
+    else:
+        pg.init()
+        main(vector=args.vector, dirty=args.dirty, bg_speed=args.bg_speed, max_fps=args.max_fps,
+             profile_out=args.profile_out, seed=args.seed, record=args.record, replay=replay,
+             level=args.level, players=args.players, bots=args.bots,
+             precise=args.precise, effects_budget=args.effects_budget)
     pg.quit()
     sys.exit()
@@ -0,0 +1,479 @@
+"""
+真！こうかとん無双のオンライン2人プレイ（ロールバック方式）
+フレームごとの入力ビットだけをUDPで送り合う．相手の入力がまだ届いていないフレームは
+直前の入力が続くと予測して進め，予測と違う入力が届いたらそのフレームのスナップショットまで
+巻き戻して（Game.restore）届いた入力で現在まで進め直す
+
+実行例（同じPCで2つのウィンドウを開く．--latency，--lossで遅延と欠落を擬似的に加えられる）：
+    python netplay.py --player 0 --port 7000 --peer 127.0.0.1:7001 --seed 1
+    python netplay.py --player 1 --port 7001 --peer 127.0.0.1:7000 --seed 1
+画面なしで2人分をまとめて実行し，両者の最終状態が一致するか確かめる：
+    python netplay.py --loopback --latency 150 --loss 0.1 --frames 3000
+"""
+import argparse
+import heapq
+import json
+import random
+import socket
+import struct
+import sys
+import time
+import zlib
+
+import pygame as pg
+
+import musou_kokaton as mk
+
+
+class LinkShim:
+    """
+    UDPソケットの送信に遅延・揺らぎ・欠落を加える擬似回線（ループバックでの試験用）
+    """
+    def __init__(self, sock: socket.socket, latency: float = 0.0, jitter: float = 0.0, loss: float = 0.0,
+                 seed: int | None = None, clock=time.perf_counter):
+        """
+        引数1 sock：送信に使うUDPソケット
+        引数2 latency：往復の遅延（ミリ秒，片道はその半分）
+        引数3 jitter：片道の遅延の揺らぎの幅（ミリ秒，±半分の一様乱数）
+        引数4 loss：パケットを捨てる確率（0～1）
+        引数5 seed：遅延と欠落を決める乱数のシード
+        引数6 clock：現在時刻（秒）を返す関数
+        """
+        self.sock = sock
+        self.delay = latency/2000
+        self.jitter = jitter/1000
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.queue: list[tuple[float, int, bytes, tuple]] = []  # （送信時刻，通し番号，データ，宛先）
+        self.seq = 0
+        self.sent = 0
+        self.lost = 0
+
+    def sendto(self, data: bytes, addr: tuple):
+        """
+        パケットを遅延させて送る（確率lossで捨てる）
+        """
+        if self.rng.random() < self.loss:
+            self.lost += 1
+            return
+        due = self.clock() + max(0.0, self.delay + (self.rng.random()-0.5)*self.jitter)
+        heapq.heappush(self.queue, (due, self.seq, data, addr))
+        self.seq += 1
+
+    def flush(self):
+        """
+        送信時刻になったパケットを実際に送る
+        """
+        now = self.clock()
+        while self.queue and self.queue[0][0] <= now:
+            _, _, data, addr = heapq.heappop(self.queue)
+            try:
+                self.sock.sendto(data, addr)
+                self.sent += 1
+            except OSError:  # 相手がまだ起動していないなど
+                pass
+
+
+class PeerMismatch(ValueError):
+    """
+    相手とシードやステージファイルが違い，同じ展開にならないときに送出する例外
+    """
+
+
+class NetSession:
+    """
+    1人分のロールバック方式の対戦セッション
+    自分の入力は入力遅延（delay）フレーム後に使い，相手の入力は届くまで予測する
+    毎フレーム進める前にスナップショットを取り，予測が外れたら外れたフレームから進め直す
+    相手より max_rollback フレーム以上先に進みそうなときは，入力が届くまで待つ
+    ゲームオーバーやクリアも予測した入力で進めた結果かもしれないので，終わったフレームまでの
+    相手の入力がすべて届くまでは（finished()がTrueになるまで）tick()を呼び続ける
+
+    パケット：ヘッダ（識別子，版，送り主，シード，ステージファイルのCRC32，入力の開始フレーム，
+    受け取り済みの相手の入力数，照合用のフレームとチェックサム）の後に，
+    相手がまだ受け取っていない自分の入力を1フレーム1バイトで並べる
+    （毎回まとめて送り直すので，パケットが欠けても次のパケットで補われる）
+    """
+    magic = b"KKNP"
+    version = 1
+    header = struct.Struct("<4sBBqIIIiI")
+    max_inputs = 128  # 1パケットに載せる入力の最大数
+    sync_interval = 60  # このフレーム間隔ごとにチェックサムを照合する
+
+    def __init__(self, player: int, sock: socket.socket, peer: tuple, seed: int, level: str = mk.LEVEL,
+                 delay: int = 2, max_rollback: int = 12, link: LinkShim | None = None):
+        """
+        引数1 player：自分が何人目か（0か1）
+        引数2 sock：受信に使う，ノンブロッキングのUDPソケット
+        引数3 peer：相手の（アドレス，ポート）
+        引数4 seed：ゲームのシード（相手と同じ値にする）
+        引数5 level：ステージファイルのパス（相手と同じものにする）
+        引数6 delay：自分の入力を使うまでのフレーム数（大きいほど巻き戻しが減り，操作の反応は遅れる）
+        引数7 max_rollback：相手の入力を予測して進めてよい最大フレーム数
+        引数8 link：送信に使う擬似回線（Noneならソケットから直接送る）
+        """
+        self.player = player
+        self.sock = sock
+        self.peer = peer
+        self.seed = seed
+        self.delay = delay
+        self.max_rollback = max_rollback
+        self.link = link
+        with open(level, "rb") as f:
+            self.level_sum = zlib.crc32(f.read())  # 相手と同じステージファイルか確かめる
+        self.game = mk.Game(seed=seed, level=level, players=2)
+        self.local = bytearray(delay)  # フレーム → 自分の入力（最初のdelayフレームは入力なし）
+        self.remote = bytearray()  # フレーム → 届いた相手の入力（先頭から途切れなく）
+        self.peer_ack = 0  # 相手が受け取った自分の入力の数
+        self.predicted: dict[int, int] = {}  # フレーム → 予測して使った相手の入力
+        self.snapshots: dict[int, mk.GameState] = {}  # フレーム → そのフレームを進める前の状態
+        self.rollback_to: int | None = None  # 予測が外れた最初のフレーム
+        self.checksums: dict[int, int] = {}  # 入力が確定したフレーム → 進めた後のチェックサム
+        self.peer_sync = (-1, 0)  # 相手から届いた（フレーム，チェックサム）
+        self.desync: int | None = None  # チェックサムが食い違ったフレーム
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.max_depth = 0  # 巻き戻したフレーム数の最大
+        self.stalls = 0  # 相手の入力を待って止まったフレーム数
+
+    def _inputs(self, tmr: int) -> tuple[int, int]:
+        """
+        フレームtmrで使う2人分の入力を返す（相手の入力が未着なら直前の入力が続くと予測する）
+        """
+        if tmr < len(self.remote):
+            other = self.remote[tmr]
+        else:
+            other = self.remote[-1] if self.remote else 0
+            self.predicted[tmr] = other
+        own = self.local[tmr]
+        return (own, other) if self.player == 0 else (other, own)
+
+    def _frames(self) -> int:
+        """
+        戻り値：入力を使って進めたフレーム数（ゲームが終わったフレームはtmrが増えないので，それも数える）
+        """
+        return self.game.tmr + (self.game.state != "playing")
+
+    def _step(self):
+        """
+        スナップショットを取ってからゲームを1フレーム進める
+        """
+        game = self.game
+        tmr = game.tmr
+        self.snapshots[tmr] = game.snapshot()
+        game.step(self._inputs(tmr))
+        if tmr < len(self.remote) and tmr % self.sync_interval == self.sync_interval-1:
+            self.checksums[tmr] = game.checksum()  # 入力が確定したフレームだけを照合する
+
+    def _rollback(self):
+        """
+        予測が外れたフレームまで巻き戻し，現在のフレームまで進め直す
+        """
+        start, target = self.rollback_to, self._frames()
+        self.rollback_to = None
+        self.game.restore(self.snapshots[start])
+        while self.game.tmr < target and self.game.state == "playing":
+            self._step()
+        end = self._frames()
+        if end < target:  # 進め直したら途中で終わった：その先のフレームの予測とスナップショットはもう使わない
+            for tmr in [t for t in self.predicted if t >= end]:
+                del self.predicted[tmr]
+            for tmr in [t for t in self.snapshots if t >= end]:
+                del self.snapshots[tmr]
+        self.rollbacks += 1
+        self.resimulated += target-start
+        self.max_depth = max(self.max_depth, target-start)
+
+    def _receive(self, data: bytes):
+        """
+        相手のパケットを読み，新しく確定した入力と予測を比べる
+        """
+        if len(data) < self.header.size:
+            return
+        magic, version, player, seed, level_sum, start, ack, sync_tick, sync_sum = self.header.unpack_from(data)
+        if magic != self.magic or version != self.version or player == self.player:
+            return
+        if seed != self.seed:
+            raise PeerMismatch(f"相手のシード {seed} が自分のシード {self.seed} と違います")
+        if level_sum != self.level_sum:
+            raise PeerMismatch("相手とステージファイル（--level）の内容が違います")
+        self.peer_ack = max(self.peer_ack, ack)
+        if sync_tick > self.peer_sync[0]:
+            self.peer_sync = (sync_tick, sync_sum)
+        inputs = data[self.header.size:]
+        have = len(self.remote)
+        if start <= have < start+len(inputs):
+            self.remote += inputs[have-start:]
+            for tmr in range(have, len(self.remote)):
+                guess = self.predicted.pop(tmr, None)
+                if guess is not None and guess != self.remote[tmr]:
+                    self.rollback_to = tmr if self.rollback_to is None else min(self.rollback_to, tmr)
+        self._check_sync()
+
+    def _check_sync(self):
+        """
+        相手と自分のチェックサムを照合する
+        """
+        tick, value = self.peer_sync
+        mine = self.checksums.get(tick)
+        if mine is not None and mine != value and self.desync is None:
+            self.desync = tick
+
+    def poll(self):
+        """
+        届いたパケットをすべて読み，擬似回線の送信待ちを送る
+        """
+        if self.link is not None:
+            self.link.flush()
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:  # 相手のポートがまだ開いていない（Windows）
+                continue
+            self._receive(data)
+
+    def send(self):
+        """
+        相手がまだ受け取っていない自分の入力を送る
+        """
+        start = max(self.peer_ack, len(self.local)-self.max_inputs)
+        sync_tick = max(self.checksums, default=-1)
+        sync_sum = self.checksums.get(sync_tick, 0)
+        data = self.header.pack(self.magic, self.version, self.player, self.seed, self.level_sum, start,
+                                len(self.remote), sync_tick, sync_sum) + bytes(self.local[start:])
+        (self.link or self.sock).sendto(data, self.peer)
+
+    def tick(self, bits: int) -> bool:
+        """
+        自分の入力を1フレーム分加え，ゲームを1フレーム進める
+        相手より進みすぎているときや，（予測の上で）ゲームが終わっているときは進めずに，
+        相手の入力を受け取って外れた予測を進め直すだけにする
+        引数 bits：自分の入力ビット（delayフレーム後に使われる）
+        戻り値：ゲームを進めたかどうか
+        """
+        self.poll()
+        if self.rollback_to is not None:
+            self._rollback()
+        game = self.game
+        if game.state != "playing":
+            self.send()
+            return False
+        if game.tmr-len(self.remote) >= self.max_rollback:
+            self.stalls += 1
+            self.send()
+            return False
+        self.local.append(bits)
+        self._step()
+        self.send()
+        for tmr in [t for t in self.snapshots if t < min(len(self.remote), game.tmr)-1]:
+            del self.snapshots[tmr]  # 入力が確定したフレームにはもう戻らない
+        return True
+
+    def settle(self):
+        """
+        相手の入力を受け取り，外れた予測があれば進め直す（最後のフレームの後に呼ぶ）
+        """
+        self.poll()
+        if self.rollback_to is not None:
+            self._rollback()
+        self.send()
+
+    def confirmed(self) -> bool:
+        """
+        戻り値：今までに進めたフレームの相手の入力がすべて届いたかどうか
+        """
+        return len(self.remote) >= self._frames()
+
+    def finished(self) -> bool:
+        """
+        戻り値：ゲームが終わり，それが確定した（終わったフレームまでの相手の入力がすべて届き，
+        外れた予測が残っていない）かどうか
+        """
+        return self.game.state != "playing" and self.rollback_to is None and self.confirmed()
+
+    def stats(self) -> dict:
+        """
+        戻り値：フレーム数，状態，スコア，巻き戻し回数，進め直したフレーム数，最大の巻き戻し幅，待ったフレーム数の辞書
+        """
+        return {
+            "player": self.player,
+            "frames": self.game.tmr,
+            "state": self.game.state,
+            "score": self.game.score.value,
+            "rollbacks": self.rollbacks,
+            "resimulated": self.resimulated,
+            "max_depth": self.max_depth,
+            "stalls": self.stalls,
+            "lost": self.link.lost if self.link is not None else 0,
+            "desync": self.desync,
+        }
+
+
+def open_socket(port: int, host: str = "127.0.0.1") -> socket.socket:
+    """
+    ノンブロッキングのUDPソケットを開く
+    引数1 port：受信するポート番号
+    引数2 host：受信するアドレス
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    sock.setblocking(False)
+    return sock
+
+
+def loopback(frames: int, seed: int, latency: float = 0.0, jitter: float = 0.0, loss: float = 0.0,
+             delay: int = 2, max_rollback: int = 12, level: str = mk.LEVEL, port: int = 7000) -> dict:
+    """
+    2人分のセッションを1つのプロセスでループバックのUDPにつなぎ，自動操作で実行する
+    時刻は1フレームごとに1/FPS秒進む仮想の時計を使うので，遅延を加えても最大速度で進む
+    最後に，確定した入力だけで最初から進めた結果と両者の状態が一致するかを確かめる
+    引数1 frames：進める最大フレーム数
+    引数2 seed：ゲームと自動操作のシード
+    引数3 latency：往復の遅延（ミリ秒）
+    引数4 jitter：片道の遅延の揺らぎ（ミリ秒）
+    引数5 loss：パケットの欠落率
+    引数6 delay：入力遅延のフレーム数
+    引数7 max_rollback：予測して進めてよい最大フレーム数
+    引数8 level：ステージファイルのパス
+    引数9 port：1人目が使うポート番号（2人目はその次）
+    戻り値：各セッションの統計と，状態が一致したかどうかの辞書
+    """
+    now = [0.0]
+    clock = lambda: now[0]
+    socks = [open_socket(port), open_socket(port+1)]
+    sessions = []
+    for p in (0, 1):
+        link = LinkShim(socks[p], latency, jitter, loss, seed+p, clock)
+        sessions.append(NetSession(p, socks[p], ("127.0.0.1", port+1-p), seed, level, delay, max_rollback, link))
+    bots = [mk.BotInput(seed+p) for p in (0, 1)]
+    start = time.perf_counter()
+    try:
+        # 予測の上で終わっても，相手の入力で巻き戻れば続きがあるので，終わりが確定するまで進める
+        while any(s.game.tmr < frames and not s.finished() for s in sessions):
+            for s, bot in zip(sessions, bots):
+                if s.game.tmr < frames:
+                    s.tick(bot.read(None, len(s.local)))
+                else:
+                    s.settle()
+            now[0] += 1/mk.FPS
+        for _ in range(int(5*mk.FPS)):  # 最後の入力が届くまで待つ
+            if all(s.confirmed() for s in sessions):
+                break
+            for s in sessions:
+                s.settle()
+            now[0] += 1/mk.FPS
+        for s in sessions:
+            s.settle()
+    finally:
+        for sock in socks:
+            sock.close()
+    elapsed = time.perf_counter()-start
+
+    # 確定した入力だけで最初から進め直した結果（巻き戻しなしの正解）
+    ref = mk.Game(seed=seed, level=level, players=2)
+    frames = min(frames, *(len(s.local) for s in sessions))  # 入力が足りなければ一致しない
+    while ref.tmr < frames and ref.state == "playing":
+        ref.step((sessions[0].local[ref.tmr], sessions[1].local[ref.tmr]))
+    checksums = [s.game.checksum() for s in sessions]
+    return {
+        "sessions": [s.stats() for s in sessions],
+        "in_sync": checksums[0] == checksums[1] == ref.checksum(),
+        "seconds": elapsed,
+    }
+
+
+def play(session: NetSession, screen: pg.Surface):
+    """
+    オンライン対戦を画面付きで実行する（矢印キー＋スペースで自分のこうかとんを操作，Escで終了）
+    引数1 session：対戦セッション
+    引数2 screen：画面Surface
+    """
+    bg = mk.Background([("fig/pg_bg.jpg", 1.0)])
+    binding = mk.KeyboardInput(mk.KEYMAPS[0])
+    clock = pg.time.Clock()
+    tick = 1/mk.FPS
+    acc = 0.0
+    last = time.perf_counter()
+    while True:
+        for event in pg.event.get():
+            if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
+                return
+        now = time.perf_counter()
+        acc = min(acc+now-last, mk.MAX_CATCHUP*tick)
+        last = now
+        key_lst = pg.key.get_pressed()
+        while acc >= tick:
+            if not session.finished():
+                session.tick(binding.read(key_lst, len(session.local)))
+            else:
+                session.settle()
+            acc -= tick
+        game = session.game
+        bg.draw(screen, 4*game.tmr)
+        game.draw(screen)
+        info = f"{session.player+1}P  ROLLBACK {session.rollbacks}  WAIT {session.stalls}"
+        if session.desync is not None:
+            info += f"  DESYNC@{session.desync}"
+        txt = mk.TEXT.render(info, 28, (255, 255, 255))
+        screen.blit(txt, (10, 10))
+        if session.finished():  # 予測の上で終わっただけなら，巻き戻って続くかもしれないので表示しない
+            msg = mk.TEXT.render("GAME OVER" if game.state == "over" else "GAME CLEAR!", 80, (255, 255, 0))
+            screen.blit(msg, msg.get_rect(center=(mk.WIDTH//2, mk.HEIGHT//2)))
+        pg.display.update()
+        clock.tick(mk.FPS)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="真！こうかとん無双のオンライン2人プレイ")
+    parser.add_argument("--player", type=int, choices=(0, 1), default=0, help="自分が何人目か（0か1）")
+    parser.add_argument("--port", type=int, default=7000, help="受信するポート番号")
+    parser.add_argument("--peer", default="127.0.0.1:7001", help="相手の アドレス:ポート")
+    parser.add_argument("--bind", default="0.0.0.0", help="受信するアドレス")
+    parser.add_argument("--seed", type=int, default=0, help="ゲームのシード（相手と同じ値にする）")
+    parser.add_argument("--level", default=mk.LEVEL, help="ステージファイルのパス（相手と同じものにする）")
+    parser.add_argument("--delay", type=int, default=2, help="自分の入力を使うまでのフレーム数")
+    parser.add_argument("--max-rollback", type=int, default=12, help="相手の入力を予測して進めてよい最大フレーム数")
+    parser.add_argument("--latency", type=float, default=0.0, help="擬似的に加える往復の遅延（ミリ秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="擬似的に加える片道の遅延の揺らぎ（ミリ秒）")
+    parser.add_argument("--loss", type=float, default=0.0, help="擬似的にパケットを捨てる確率（0～1）")
+    parser.add_argument("--loopback", action="store_true", help="画面なしで2人分を1つのプロセスで自動操作して確かめる")
+    parser.add_argument("--frames", type=int, default=3000, help="--loopbackで進める最大フレーム数")
+    args = parser.parse_args()
+
+    if args.loopback:
+        pg.font.init()  # スコア表示にフォントを使う（画面は作らない）
+        result = loopback(args.frames, args.seed, args.latency, args.jitter, args.loss,
+                          args.delay, args.max_rollback, args.level, args.port)
+        print(json.dumps(result, indent=2))
+        return 0 if result["in_sync"] else 1
+
+    host, port = args.peer.rsplit(":", 1)
+    sock = open_socket(args.port, args.bind)
+    link = LinkShim(sock, args.latency, args.jitter, args.loss) if args.latency or args.jitter or args.loss else None
+    pg.init()
+    pg.display.set_caption(f"真！こうかとん無双 オンライン {args.player+1}P")
+    screen = pg.display.set_mode((mk.WIDTH, mk.HEIGHT))
+    mk.preload_assets(screen)
+    mk.Bomb.prerender()
+    session = NetSession(args.player, sock, (host, int(port)), args.seed, args.level,
+                         args.delay, args.max_rollback, link)
+    error = None
+    try:
+        play(session, screen)
+    except PeerMismatch as e:  # 設定の食い違いは使い方の誤りなので，統計を出して終了コードで知らせる
+        error = str(e)
+    finally:
+        sock.close()
+    print(json.dumps(session.stats(), indent=2))
+    pg.quit()
+    if error is not None:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
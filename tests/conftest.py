@@ -0,0 +1,23 @@
+"""
+テスト共通の設定
+画面を作らずにpygameを使い，リポジトリ直下のモジュールをimportできるようにする
+"""
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fonts():
+    """
+    スコア表示にフォントを使うので，画面は作らずにフォントだけ初期化する
+    """
+    pg.font.init()
+    yield
@@ -0,0 +1,65 @@
+import pygame as pg
+import pytest
+
+import musou_kokaton as mk
+
+
+def spread(field: mk.EffectField, count: int, life: int = 100):
+    """
+    まとめられない間隔で爆発を並べて出す
+    """
+    for i in range(count):
+        field.spawn((50+100*(i % 10), 50+100*(i//10)), life)
+
+
+def test_budget_must_be_positive():
+    with pytest.raises(ValueError):
+        mk.EffectField(budget=0)
+
+
+def test_over_budget_still_draws_newest_and_recovers():
+    field = mk.EffectField(budget=0.001)
+    spread(field, 20)
+    screen = pg.Surface((mk.WIDTH, mk.HEIGHT))
+    field.cost = 1.0  # 1つ描くのに1秒かかったことにする（予算の1/1000未満しか描けない）
+    field.draw(screen)
+    assert field.skipped == 19  # 最新の1つだけ描く
+    assert field.cost < 1.0  # 描いた分で測り直している
+    for _ in range(100):
+        field.draw(screen)
+    assert field.cost < 0.01
+
+
+def test_life_and_merge():
+    field = mk.EffectField()
+    field.spawn((100, 100), 3)
+    field.spawn((105, 95), 5)  # 近くの爆発はまとめて長い方に延ばす
+    assert len(field) == 1 and field.merged == 1
+    for _ in range(5):
+        field.update()
+    assert len(field) == 1
+    field.update()
+    assert len(field) == 0
+
+
+def test_capacity_drops_oldest():
+    field = mk.EffectField(capacity=4)
+    spread(field, 6)
+    assert len(field) == 4 and field.dropped == 2
+    assert field.toplefts()[0][0] < field.toplefts()[1][0]
+
+
+def test_snapshot_restore():
+    field = mk.EffectField()
+    spread(field, 3, life=2)
+    field.update()
+    snap = field.snapshot()
+    for _ in range(3):
+        field.update()
+    assert len(field) == 0
+    field.restore(snap)
+    assert len(field) == 3
+    field.update()  # 残り1フレームから続く
+    assert len(field) == 3
+    field.update()
+    assert len(field) == 0
@@ -0,0 +1,68 @@
+import inspect
+import random
+
+import pygame as pg
+
+import musou_kokaton as mk
+
+
+def make_enemy() -> mk.Enemy:
+    return mk.Enemy(random.Random(1))
+
+
+def test_group_membership():
+    a, b = pg.sprite.Group(), pg.sprite.Group()
+    emy = make_enemy()
+    assert not emy.alive()
+    emy.add(a, [b, a])  # 入れ子のリストと重複を受け付ける
+    assert emy.alive() and set(emy.groups()) == {a, b}
+    assert a.has(emy) and b.has(emy)
+    emy.remove(a)
+    assert emy.groups() == [b] and not a.has(emy)
+    a.add(emy)  # グループ側から追加してもSpriteと同じように記録される
+    assert set(emy.groups()) == {a, b}
+    b.remove(emy)
+    assert emy.groups() == [a]
+    emy.kill()
+    assert not emy.alive() and len(a) == 0 and len(b) == 0
+
+
+def test_group_methods_keep_membership():
+    group = pg.sprite.Group()
+    emys = [make_enemy() for _ in range(3)]
+    group.add(emys)
+    group.remove(emys[1])
+    assert [e.alive() for e in emys] == [True, False, True]
+    group.empty()
+    assert not any(e.alive() for e in emys)
+
+
+
+def test_pygame_helpers_see_membership():
+    group, other = pg.sprite.Group(), pg.sprite.Group()
+    emys = [make_enemy() for _ in range(3)]
+    group.add(emys)
+    other.add(emys[0])
+    hits = pg.sprite.spritecollide(emys[0], group, True)  # 重なった3体を全グループから消す
+    assert len(hits) == 3 and len(group) == 0 and len(other) == 0
+    assert not any(e.alive() for e in emys)
+
+    single = pg.sprite.GroupSingle(emys[0])
+    assert emys[0].groups() == [single]
+    single.sprite = emys[1]  # 入れ替えると前のスプライトは外れる
+    assert not emys[0].alive() and emys[1].groups() == [single]
+    emys[1].kill()
+    assert single.sprite is None
+
+    layered = pg.sprite.LayeredUpdates()
+    layered.add(emys[2], layer=3)
+    assert layered.get_layer_of_sprite(emys[2]) == 3 and emys[2].groups() == [layered]
+    layered.empty()
+    assert not emys[2].alive()
+
+
+def test_overrides_all_sprite_storage_users():
+    # pygame.sprite.Spriteの所属グループ（__g）を読み書きするメソッドは，すべてEntityで上書きしている
+    users = [name for name, attr in vars(pg.sprite.Sprite).items()
+             if callable(attr) and "__g" in inspect.getsource(attr)]
+    assert users and all(name in vars(mk.Entity) for name in users), users
@@ -0,0 +1,58 @@
+import random
+
+import pygame as pg
+import pytest
+
+import musou_kokaton as mk
+
+
+def make_groups(seed: int, na: int, nb: int) -> tuple[pg.sprite.Group, pg.sprite.Group]:
+    """
+    ランダムな位置と大きさのスプライトを入れた2つのグループを作る（画面外にはみ出すものも含む）
+    """
+    rng = random.Random(seed)
+    groups = []
+    for n in (na, nb):
+        group = pg.sprite.Group()
+        for _ in range(n):
+            sprite = pg.sprite.Sprite()
+            sprite.rect = pg.Rect(rng.randrange(-50, mk.WIDTH), rng.randrange(-50, mk.HEIGHT),
+                                  rng.randrange(1, 120), rng.randrange(1, 120))
+            group.add(sprite)
+        groups.append(group)
+    return groups[0], groups[1]
+
+
+def ids(result: dict) -> list:
+    """
+    groupcollideの結果をスプライトの作成順の番号で比べられる形にする
+    """
+    return [(a.rect.topleft, [b.rect.topleft for b in hits]) for a, hits in result.items()]
+
+
+@pytest.mark.parametrize("na, nb", [(5, 30), (80, 300), (300, 80), (100, 100)])
+@pytest.mark.parametrize("dokilla, dokillb", [(False, False), (True, True), (False, True), (True, False)])
+def test_groupcollide_matches_pygame(na, nb, dokilla, dokillb):
+    a1, b1 = make_groups(na*1000+nb, na, nb)
+    expected = pg.sprite.groupcollide(a1, b1, dokilla, dokillb)
+    a2, b2 = make_groups(na*1000+nb, na, nb)
+    grid = mk.SpatialGrid()
+    grid.register("b", b2)
+    result = grid.groupcollide(a2, "b", dokilla, dokillb)
+    assert ids(result) == ids(expected)
+    assert [s.rect.topleft for s in a2] == [s.rect.topleft for s in a1]
+    assert [s.rect.topleft for s in b2] == [s.rect.topleft for s in b1]
+
+
+@pytest.mark.parametrize("nb", [10, 500])
+def test_spritecollide_matches_pygame(nb):
+    a1, b1 = make_groups(nb, 4, nb)
+    a2, b2 = make_groups(nb, 4, nb)
+    grid = mk.SpatialGrid()
+    grid.register("b", b2)
+    grid.groupcollide(a2, "b", False, False)  # 多ければ振り分け済みのセルから答える
+    for s1, s2 in zip(a1.sprites(), a2.sprites()):
+        expected = pg.sprite.spritecollide(s1, b1, True)
+        result = grid.spritecollide(s2, "b", True)
+        assert [s.rect.topleft for s in result] == [s.rect.topleft for s in expected]
+    assert len(b1) == len(b2)
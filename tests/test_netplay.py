@@ -0,0 +1,42 @@
+import itertools
+import time
+
+import pytest
+
+import musou_kokaton as mk
+import netplay
+
+PORTS = itertools.count(7600, 2)
+
+
+@pytest.mark.parametrize("latency, jitter, loss, seeds", [
+    (0, 0, 0.0, (1, 2)),
+    (150, 0, 0.1, (10, 15, 24, 37)),  # 予測の上のゲームオーバーで止まっていたシード
+    (250, 60, 0.2, (1, 10, 15, 23, 34)),  # 進め直して早く終わったときに古い予測が残っていたシード
+])
+def test_loopback_in_sync(latency, jitter, loss, seeds):
+    for seed in seeds:
+        result = netplay.loopback(3000, seed, latency, jitter, loss, port=next(PORTS))
+        assert result["in_sync"], (seed, result["sessions"])
+        assert len({(s["frames"], s["state"]) for s in result["sessions"]}) == 1
+
+
+@pytest.mark.parametrize("change", ["seed", "level"])
+def test_mismatched_peer_is_reported(tmp_path, change):
+    level = tmp_path / "stage.json"
+    with open(mk.LEVEL, "rb") as f:
+        level.write_bytes(f.read() + b"\n")  # 内容だけが違うステージファイル
+    port = next(PORTS)
+    socks = [netplay.open_socket(port), netplay.open_socket(port+1)]
+    try:
+        mine = netplay.NetSession(0, socks[0], ("127.0.0.1", port+1), 1)
+        other = netplay.NetSession(1, socks[1], ("127.0.0.1", port), 2 if change == "seed" else 1,
+                                   str(level) if change == "level" else mk.LEVEL)
+        other.send()
+        with pytest.raises(netplay.PeerMismatch, match="シード" if change == "seed" else "ステージ"):
+            for _ in range(100):  # ループバックでもすぐには届かないことがあるので少し待つ
+                mine.poll()
+                time.sleep(0.001)
+    finally:
+        for sock in socks:
+            sock.close()
@@ -0,0 +1,36 @@
+import struct
+
+import pytest
+
+import musou_kokaton as mk
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path/"game.rep")
+    recorded = mk.run_headless(1500, seed=4, record=path, bots=True)
+    replay = mk.Replay.load(path)
+    assert replay.seed == 4 and replay.players == 2
+    result = mk.run_headless(0, replay=replay)
+    assert result["in_sync"]
+    assert (result["frames"], result["score"], result["state"]) == \
+        (recorded["frames"], recorded["score"], recorded["state"])
+
+
+def test_replay_detects_changed_inputs(tmp_path):
+    path = str(tmp_path/"game.rep")
+    mk.run_headless(800, seed=4, record=path, bots=True)
+    replay = mk.Replay.load(path)
+    replay.inputs[100:200] = bytes(100)  # 途中の入力を消す
+    assert not mk.run_headless(0, replay=replay)["in_sync"]
+
+
+def test_old_version_is_rejected(tmp_path):
+    path = str(tmp_path/"old.rep")
+    replay = mk.Replay(1)
+    replay.record((0, 0))
+    replay.save(path)
+    with open(path, "r+b") as f:  # 版の番号だけを古くする
+        f.seek(4)
+        f.write(struct.pack("<H", mk.Replay.version-1))
+    with pytest.raises(ValueError, match="版"):
+        mk.Replay.load(path)
@@ -0,0 +1,45 @@
+import musou_kokaton as mk
+
+
+def add_bombs(game: mk.Game, count: int) -> list[mk.Bomb]:
+    emitter = mk.Bomb_Enemy(game.rng)
+    emitter.rect.center = mk.WIDTH-200, mk.HEIGHT//2
+    bombs = [mk.Bomb.spawn(game.pools, emitter, game.birds[0], game.rng) for _ in range(count)]
+    game.bombs.add(bombs)
+    return bombs
+
+
+def bomb_state(game: mk.Game) -> list[tuple]:
+    return [(bomb.rect.topleft, bomb.vx, bomb.vy) for bomb in game.bombs]
+
+
+def test_restore_does_not_take_sprites_from_other_game():
+    a, b = mk.Game(seed=1), mk.Game(seed=2)
+    add_bombs(a, 5)
+    state = a.snapshot()
+    expected = bomb_state(a)
+    a.close()  # Aの爆弾はAのプールに戻る
+    b_bombs = add_bombs(b, 5)  # Bは自分のプールから取るので，Aの爆弾を使わない
+    b_expected = bomb_state(b)
+    a.restore(state)
+    assert bomb_state(a) == expected
+    assert bomb_state(b) == b_expected and b.bombs.sprites() == b_bombs
+    assert not set(map(id, a.bombs)) & set(map(id, b.bombs))
+    assert all(bomb.pool is a.pools[mk.Bomb] for bomb in a.bombs)
+
+
+def test_restore_takes_back_reused_sprites():
+    game = mk.Game(seed=1)
+    add_bombs(game, 3)
+    state = game.snapshot()
+    expected = bomb_state(game)
+    for _ in range(30):
+        game.step((0, 0))
+    game.close()
+    add_bombs(game, 3)  # 同じGameが再利用した爆弾も，復元すると元の状態に戻る
+    assert game.pool_stats()["Bomb"]["reused"] == 3
+    for _ in range(2):  # 同じ状態に何度でも戻せる
+        game.restore(state)
+        assert bomb_state(game) == expected
+        free = set(map(id, game.pools[mk.Bomb].free))
+        assert not free & set(map(id, game.bombs))
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import musou_kokaton as mk
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_loads_nothing(tmp_path):
+    """
+    importではNumPy・画像を読み込まず，作業ディレクトリも変えない
+    """
+    code = ("import os; cwd = os.getcwd(); import musou_kokaton as mk; "
+            "print(mk.np is None, os.getcwd() == cwd, mk.ASSETS.loads)")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.split()[-3:] == ["True", "True", "0"]
+
+
+def test_load_numpy():
+    numpy = pytest.importorskip("numpy")
+    assert mk.load_numpy() is numpy
+    assert mk.np is numpy
@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+import musou_kokaton as mk
+
+pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("seed, invincible", [(1, False), (4, True)])
+@pytest.mark.parametrize("precise", [False, True])
+def test_vector_matches_sprites(seed, invincible, precise):
+    """
+    配列版の弾とスプライト版の弾で，毎フレームのチェックサムが一致する
+    """
+    games = [mk.Game(vector, seed=seed, precise=precise) for vector in (False, True)]
+    for game in games:
+        game.invincible = invincible
+    rng = random.Random(seed)
+    for _ in range(2200):  # 無敵ならボスの出現（2000フレーム）まで進める
+        inputs = (rng.randrange(32), rng.randrange(32))
+        states = [game.step(inputs) for game in games]
+        assert games[0].checksum() == games[1].checksum()
+        if states[0] != "playing":
+            break
+    for game in games:
+        game.close()